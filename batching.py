@@ -0,0 +1,95 @@
+"""Group commit for POST /books/.
+
+With GROUP_COMMIT_ENABLED, concurrent create_book calls are collected for a
+few milliseconds and written with one multi-row INSERT and one COMMIT, so a
+burst of inserts costs MySQL one log flush instead of one per book. Each caller
+still gets its own id or error. The batcher can be switched and tuned while
+the app runs through PUT /admin/group-commit. Every worker process has its
+own batcher, so a change made there applies to the worker that served it;
+GROUP_COMMIT_* in the environment is what all workers start from.
+"""
+import asyncio
+
+import config
+
+
+class GroupCommitBatcher:
+    """Coalesces single-book inserts into batches.
+
+    The first book to arrive opens a batch. The batch is written when it holds
+    ``max_rows`` books or ``window_ms`` after it opened, whichever comes first.
+    ``write`` is an async callable taking a list of books and returning one
+    ``(id, error)`` pair per book; ``error`` is an exception to raise to that
+    book's caller, or None.
+    """
+
+    def __init__(self, write, enabled=config.GROUP_COMMIT_ENABLED, window_ms=config.GROUP_COMMIT_WINDOW_MS,
+                 max_rows=config.GROUP_COMMIT_MAX_ROWS):
+        self._write = write
+        self.enabled = enabled
+        self.window_ms = window_ms
+        self.max_rows = max_rows
+        self._pending = []  # (book, future) pairs of the open batch
+        self._timer = None  # Closes the open batch when its window ends
+        self._writes = set()  # Batches being written, kept referenced until they finish
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, book):
+        """Queue ``book`` for the next batch and return its id once the batch is committed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((book, future))
+        if len(self._pending) >= self.max_rows:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self.flush)
+        return await future
+
+    def flush(self):
+        """Start writing the open batch now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write_batch(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write_batch(self, batch):
+        self.batches += 1
+        self.rows += len(batch)
+        try:
+            results = await self._write([book for book, _ in batch])
+        except Exception as e:  # The whole batch failed, e.g. no connection; every caller gets the error
+            results = [(None, e)] * len(batch)
+        for (_, future), (book_id, error) in zip(batch, results):
+            if future.done():  # The caller went away; its book is written all the same
+                continue
+            if error is None:
+                future.set_result(book_id)
+            else:
+                future.set_exception(error)
+
+    async def drain(self):
+        """Write the open batch and wait for every batch in flight."""
+        self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def configure(self, enabled=None, window_ms=None, max_rows=None):
+        """Change the settings; turning batching off writes what is already queued first."""
+        if window_ms is not None:
+            self.window_ms = window_ms
+        if max_rows is not None:
+            self.max_rows = max_rows
+        if enabled is not None:
+            self.enabled = enabled
+        if not self.enabled:
+            await self.drain()
+
+    def stats(self):
+        return {"enabled": self.enabled, "window_ms": self.window_ms, "max_rows": self.max_rows,
+                "batches": self.batches, "rows": self.rows,
+                "average_batch": round(self.rows / self.batches, 2) if self.batches else 0.0}
@@ -0,0 +1,90 @@
+"""Compare plain and prepared-statement cursors for the GET /books/{book_id} and create_book queries.
+
+Runs crud.get_versioned_book and crud.create_book directly on one MySQL
+connection, first with the statement cache disabled (every call sends its SQL
+text to be parsed) and then enabled (each statement is prepared once and
+re-executed). Reports the time per call and the server's Com_stmt_prepare /
+Com_stmt_execute / Com_select / Com_insert counters, which show how many
+statements MySQL had to parse. The books it creates are deleted afterwards.
+
+Usage: python benchmarks/bench_prepared.py [--calls 2000] [--cache-size 64]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud  # noqa: E402
+import database  # noqa: E402
+from models import Book  # noqa: E402
+
+COUNTERS = ("Com_stmt_prepare", "Com_stmt_execute", "Com_select", "Com_insert")
+
+
+def session_counters(connection):
+    """Read this session's statement counters."""
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW SESSION STATUS WHERE Variable_name IN (%s, %s, %s, %s)", COUNTERS)
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def run(pool, calls, book_ids, isbn_prefix):
+    """Time ``calls`` lookups and inserts on one connection; return per-call seconds, counter deltas and new ids."""
+    created = []
+    with pool.connection() as connection:
+        before = session_counters(connection)
+        started = time.perf_counter()
+        for book_id in book_ids[:calls]:
+            crud.get_versioned_book(connection, book_id)
+        get_seconds = (time.perf_counter() - started) / calls
+
+        started = time.perf_counter()
+        for number in range(calls):
+            book = Book(title=f"Prepared bench {number}", author="Bench Author", genre="Bench",
+                        year_published=2000, isbn=f"{isbn_prefix}-{number:010d}")
+            created.append(crud.create_book(connection, book))
+        create_seconds = (time.perf_counter() - started) / calls
+        after = session_counters(connection)
+        counters = {name: after[name] - before[name] for name in COUNTERS}
+    return get_seconds, create_seconds, counters, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="lookups and inserts per mode")
+    parser.add_argument("--cache-size", type=int, default=64, help="statement cache size for the prepared run")
+    args = parser.parse_args()
+
+    with database.pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT id FROM books ORDER BY id LIMIT %s", (args.calls,))
+        existing = [row[0] for row in cursor.fetchall()]
+    if not existing:
+        sys.exit("The books table is empty; seed it first, e.g. with benchmarks/load_test.py")
+    book_ids = [random.choice(existing) for _ in range(args.calls)]
+
+    results = {}
+    created = []
+    try:
+        prefixes = random.sample(range(100, 1000), 2)  # Fresh ISBNs for each run
+        for (mode, cache_size), prefix in zip((("plain", 0), ("prepared", args.cache_size)), prefixes):
+            pool = database.ConnectionPool(min_size=0, max_size=1, statement_cache_size=cache_size)
+            get_seconds, create_seconds, counters, ids = run(pool, args.calls, book_ids, f"{prefix:03d}")
+            created += ids
+            pool.close()
+            results[mode] = (get_seconds, create_seconds)
+            print(f"{mode:>9}: get {get_seconds * 1e6:8.1f} us/call  create {create_seconds * 1e6:8.1f} us/call  "
+                  + "  ".join(f"{name}={value}" for name, value in counters.items()))
+    finally:
+        with database.pool.connection() as connection:
+            for book_id in created:
+                crud.delete_book(connection, book_id)
+
+    plain, prepared = results["plain"], results["prepared"]
+    print(f"  speedup: get {plain[0] / prepared[0]:.2f}x  create {plain[1] / prepared[1]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Load test for the /books/ API.
+
+Drives main.app in-process through httpx's ASGI transport (on any of the
+storage engines in storage.py), or a running uvicorn server with --url, using a weighted
+mix of create/get/list/update/delete requests. Reports p50/p95/p99 latency
+and throughput per operation, optionally saving them as JSON and comparing
+them with an earlier run.
+
+Examples:
+    python benchmarks/load_test.py --backend sqlite --requests 5000 --concurrency 32
+    python benchmarks/load_test.py --url http://localhost:8000 --mix get=8,list=1,create=1 --output run.json
+    python benchmarks/load_test.py --backend sqlite --compare run.json
+    python benchmarks/load_test.py --backend memory --requests 20000   # The HTTP layer alone, no database cost
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+OPERATIONS = ("create", "get", "list", "update", "delete")
+DEFAULT_MIX = "create=1,get=6,list=2,update=1,delete=0"
+
+
+def parse_mix(text):
+    """Parse 'get=6,list=2' into {operation: weight}."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    """Latency percentiles (ms), request rate and status counts for one operation."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 0.50),
+        "p95_ms": percentile(values, 0.95),
+        "p99_ms": percentile(values, 0.99),
+        "mean_ms": sum(values) / len(values) if values else None,
+        "max_ms": values[-1] if values else None,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "errors": errors,
+    }
+
+
+class LoadTest:
+    def __init__(self, client, mix, total, concurrency, seed):
+        self.client = client
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.total = total
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.isbn_prefix = f"{self.random.randrange(1000):03d}-{random.randrange(10000):04d}"  # Unique per run on a persistent database
+        self.isbn_counter = 0
+        self.ids = []  # Books known to exist, used by get/update/delete
+        self.issued = 0
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.statuses = {name: {} for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+
+    def new_book(self):
+        self.isbn_counter += 1
+        return {
+            "title": f"Load test book {self.isbn_counter}",
+            "author": f"Author {self.random.randrange(500)}",
+            "genre": self.random.choice(("Fiction", "History", "Science", "Poetry")),
+            "year_published": self.random.randrange(1900, 2025),
+            "isbn": f"{self.isbn_prefix}{self.isbn_counter:06d}",
+        }
+
+    async def seed(self, count):
+        """Create ``count`` books before timing starts and remember their ids."""
+        for start in range(0, count, 1000):
+            books = [self.new_book() for _ in range(min(1000, count - start))]
+            response = await self.client.post("/books/bulk", json=books)
+            response.raise_for_status()
+            for first, last in response.json()["ids"]:  # Inserted ids come back as [first, last] ranges
+                self.ids.extend(range(first, last + 1))
+
+    async def request(self, name):
+        if name in ("get", "update", "delete") and not self.ids:
+            name = "create"  # Nothing to read or change yet
+        if name == "create":
+            response = await self.client.post("/books/", json=self.new_book())
+            if response.status_code in (200, 201):
+                created_id = response.json().get("id")
+                if created_id is not None:
+                    self.ids.append(created_id)
+            return name, response
+        if name == "list":
+            return name, await self.client.get("/books/", params={"limit": 50})
+        book_id = self.random.choice(self.ids)
+        if name == "get":
+            return name, await self.client.get(f"/books/{book_id}")
+        if name == "update":
+            return name, await self.client.patch(f"/books/{book_id}", json={"title": f"Updated {time.time_ns()}"})
+        self.ids.remove(book_id)
+        return name, await self.client.delete(f"/books/{book_id}")
+
+    async def worker(self):
+        while self.issued < self.total:
+            self.issued += 1
+            name = self.random.choices(self.names, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                name, response = await self.request(name)
+            except httpx.HTTPError:
+                self.errors[name] += 1
+                continue
+            self.latencies[name].append((time.perf_counter() - started) * 1000)
+            self.statuses[name][response.status_code] = self.statuses[name].get(response.status_code, 0) + 1
+            if response.status_code >= 500:
+                self.errors[name] += 1
+
+    async def run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self.worker() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        operations = {name: summarize(self.latencies[name], self.statuses[name], self.errors[name], elapsed)
+                      for name in OPERATIONS if self.latencies[name] or self.errors[name]}
+        every_latency = [value for values in self.latencies.values() for value in values]
+        overall = summarize(every_latency, {}, sum(self.errors.values()), elapsed)
+        del overall["statuses"]
+        return {"elapsed_s": elapsed, "overall": overall, "operations": operations}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results, baseline=None):
+    header = f"{'operation':>10} {'requests':>9} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    rows = list(results["operations"].items()) + [("overall", results["overall"])]
+    for name, stats in rows:
+        line = (f"{name:>10} {stats['requests']:>9} {stats['rps']:>9.1f} {stats['p50_ms'] or 0:>9.2f} "
+                f"{stats['p95_ms'] or 0:>9.2f} {stats['p99_ms'] or 0:>9.2f} {stats['errors']:>7}")
+        previous = baseline["overall"] if baseline and name == "overall" else (
+            baseline["operations"].get(name) if baseline else None)
+        if previous and previous.get("p95_ms") and stats["p95_ms"]:
+            line += (f"   p95 {(stats['p95_ms'] / previous['p95_ms'] - 1) * 100:+.1f}%"
+                     f"  rps {(stats['rps'] / previous['rps'] - 1) * 100:+.1f}% vs {baseline['commit'] or 'baseline'}")
+        print(line)
+
+
+async def main_async(args):
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        import main
+        import storage
+        if args.backend == "sqlite":
+            database_path = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix="books-bench-"), "books.db")
+            main.repository = storage.SQLiteRepository(database_path)
+        elif args.backend == "memory":
+            main.repository = storage.InMemoryRepository()
+        main.repository.open()  # The ASGI transport does not run the lifespan handler
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://books.test"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        test = LoadTest(client, args.mix, args.requests, args.concurrency, args.seed)
+        if args.seed_books:
+            await test.seed(args.seed_books)
+        return await test.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__.split("\n\n", 2)[2])
+    parser.add_argument("--url", help="base URL of a running server; drives main.app in-process when omitted")
+    parser.add_argument("--backend", choices=("mysql", "sqlite", "memory"), default="mysql",
+                        help="storage engine for in-process runs (default: the MySQL server in config.py)")
+    parser.add_argument("--sqlite-path", help="database file for --backend sqlite (default: a temporary file)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--seed-books", type=int, default=1000, help="books created through POST /books/bulk before timing")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the request mix")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or f"in-process/{args.backend}",
+        "config": {"mix": args.mix, "requests": args.requests, "concurrency": args.concurrency,
+                   "seed_books": args.seed_books, "seed": args.seed},
+        **results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Soak test that checks the API does not leak database connections.
+
+Sends tens of thousands of mixed requests to main.app in-process, deliberately
+including error paths (missing books, invalid payloads, duplicate ISBNs,
+bad cursors), and samples the connection pool as it goes. Exits non-zero if
+connections are still checked out once traffic stops, or if the pool keeps
+opening connections after warm-up. tests/test_soak.py runs a shorter soak on
+SQLite as part of the test suite.
+
+Examples:
+    python benchmarks/soak_test.py --backend sqlite
+    python benchmarks/soak_test.py --requests 50000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+
+def book(isbn_number, **overrides):
+    return {"title": f"Soak book {isbn_number}", "author": "Soak Author", "genre": "Test",
+            "year_published": 2000, "isbn": f"{isbn_number // 10**10 % 1000:03d}-{isbn_number % 10**10:010d}", **overrides}
+
+
+class Soak:
+    def __init__(self, client, pool, total, concurrency, seed):
+        self.client = client
+        self.pool = pool  # The repository's connection pool, sampled as requests go out
+        self.total = total
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.next_isbn = random.randrange(10**12)
+        self.known_isbn = None
+        self.issued = 0
+        self.statuses = {}
+        self.samples = []  # (requests sent, pool size, connections in use, connections opened so far)
+
+    def isbn(self):
+        self.next_isbn += 1
+        return self.next_isbn
+
+    async def one(self):
+        choice = self.random.random()
+        book_id = self.random.randrange(1, 2000)
+        if choice < 0.25:
+            return await self.client.get(f"/books/{book_id}")  # Found and 404 paths
+        if choice < 0.35:
+            payload = book(self.isbn())
+            if self.known_isbn is not None and self.random.random() < 0.3:
+                payload["isbn"] = self.known_isbn  # 409 path
+            response = await self.client.post("/books/", json=payload)
+            self.known_isbn = payload["isbn"]
+            return response
+        if choice < 0.40:
+            return await self.client.post("/books/", json=book(self.isbn(), isbn="not-an-isbn"))  # 422 path
+        if choice < 0.55:
+            return await self.client.patch(f"/books/{book_id}", json={"title": f"Soak {self.issued}"})
+        if choice < 0.60 and self.known_isbn is not None:
+            return await self.client.patch(f"/books/{book_id}", json={"isbn": self.known_isbn})  # 409 or 404 path
+        if choice < 0.70:
+            return await self.client.delete(f"/books/{self.random.randrange(1, 4000)}")
+        if choice < 0.85:
+            return await self.client.get("/books/", params={"limit": 20})
+        if choice < 0.88:
+            return await self.client.get("/books/", params={"cursor": "garbage"})  # 400 path
+        if choice < 0.92:
+            return await self.client.get("/books/", params={"format": "ndjson", "limit": 50})
+        if choice < 0.96:
+            batch = [book(self.isbn()) for _ in range(5)] + [{"title": "incomplete"}]
+            return await self.client.post("/books/bulk", json=batch)
+        return await self.client.get(f"/books/by-isbn/{self.known_isbn or '000-0000000000'}")
+
+    async def worker(self):
+        while self.issued < self.total:
+            self.issued += 1
+            if self.issued % 1000 == 0:
+                stats = self.pool.stats()
+                self.samples.append((self.issued, stats["size"], stats["in_use"], stats["opened"]))
+            response = await self.one()
+            self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+
+    async def run(self):
+        await asyncio.gather(*(self.worker() for _ in range(self.concurrency)))
+
+
+async def settle(pool, timeout):
+    """Wait for scheduled connection releases to finish."""
+    deadline = time.monotonic() + timeout
+    while pool.stats()["in_use"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return pool.stats()
+
+
+async def run_soak(app, pool, requests, concurrency, seed, settle_timeout):
+    """Soak ``app``, whose repository must already be open on ``pool``; return the Soak, final pool stats and seconds taken."""
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://books.test", timeout=60) as client:
+        soak = Soak(client, pool, requests, concurrency, seed)
+        started = time.perf_counter()
+        await soak.run()
+        elapsed = time.perf_counter() - started
+    final = await settle(pool, settle_timeout)
+    return soak, final, elapsed
+
+
+def check(soak, final):
+    """Return the reasons the soak failed; empty when connections stayed flat."""
+    failures = []
+    if final["in_use"]:
+        failures.append(f"{final['in_use']} connections still checked out after traffic stopped")
+    warm = soak.samples[len(soak.samples) // 4:] if soak.samples else []
+    if warm and final["opened"] - warm[0][3] > final["max_size"]:  # More than a whole pool's worth replaced after warm-up
+        failures.append(f"{final['opened'] - warm[0][3]} connections opened after warm-up (max_size {final['max_size']})")
+    if soak.statuses.get(500):
+        failures.append(f"{soak.statuses[500]} requests failed with 500")
+    return failures
+
+
+async def main_async(args):
+    import main
+    if args.backend == "sqlite":
+        main.repository = storage.SQLiteRepository(os.path.join(tempfile.mkdtemp(prefix="books-soak-"), "books.db"))
+    main.repository.open()  # The ASGI transport does not run the lifespan handler
+    return await run_soak(main.app, main.repository.pool, args.requests, args.concurrency, args.seed, args.settle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__.split("\n\n", 2)[2])
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default="sqlite")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--settle", type=float, default=10.0, help="seconds to wait for releases after the last request")
+    args = parser.parse_args()
+
+    soak, final, elapsed = asyncio.run(main_async(args))
+    print(f"{soak.issued} requests in {elapsed:.1f}s ({soak.issued / elapsed:.0f}/s)")
+    print("status codes:", ", ".join(f"{code}={count}" for code, count in sorted(soak.statuses.items())))
+    print(f"{'requests':>9} {'open':>5} {'in use':>7} {'opened':>7}")
+    for sent, size, in_use, opened in soak.samples:
+        print(f"{sent:>9} {size:>5} {in_use:>7} {opened:>7}")
+    print(f"{'final':>9} {final['size']:>5} {final['in_use']:>7} {final['opened']:>7}  (max_size {final['max_size']})")
+
+    failures = check(soak, final)
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("OK: connection count stayed flat")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
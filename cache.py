@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+try:
+    import redis
+except ImportError:  # redis is only needed when BOOK_CACHE_REDIS_URL is set
+    redis = None
+
+
+class CacheBackend:
+    """Interface for a shared cache tier that several API workers can use."""
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove ``key`` if it is cached."""
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """Process-local stand-in for a shared backend, for development and benchmarks."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    """Shared backend storing JSON-encoded values in Redis."""
+
+    def __init__(self, url, prefix="books:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for RedisBackend")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(f"{self._prefix}{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(f"{self._prefix}{key}", json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client.delete(f"{self._prefix}{key}")
+
+
+class LRUCache:
+    """A bounded in-process cache with least-recently-used eviction and a TTL.
+
+    An optional shared ``backend`` sits behind the local tier: local misses are
+    looked up there, and writes and invalidations are applied to both.
+    """
+
+    def __init__(self, max_size=config.BOOK_CACHE_SIZE, ttl=config.BOOK_CACHE_TTL, backend=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (value, expires_at), least recently used first
+        self._lock = threading.Lock()
+        self._generation = 0  # Bumped by every invalidation, see set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self):
+        """Token to take before reading from the database and pass back to ``set``."""
+        return self._generation
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        value = self.backend.get(key) if self.backend is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+        return value
+
+    def get_many(self, keys):
+        """Return ``{key: value}`` for every key in ``keys`` that is cached."""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value, generation=None):
+        """Cache ``value`` under ``key``.
+
+        When ``generation`` is given and an invalidation happened since it was
+        taken, the value may already be stale and is not cached.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._store(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def invalidate(self, key):
+        """Drop ``key`` from every tier after the underlying row changed."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+            self.invalidations += 1
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def invalidate_many(self, keys):
+        """Drop every key in ``keys`` from every tier after a bulk change."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+        if self.backend is not None:
+            for key in keys:
+                self.backend.delete(key)
+
+    def clear(self):
+        """Drop every locally cached entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _store(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Return the cache counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def create_book_cache():
+    """Build the book cache from the settings in config.py."""
+    backend = RedisBackend(config.BOOK_CACHE_REDIS_URL) if config.BOOK_CACHE_REDIS_URL else None
+    return LRUCache(config.BOOK_CACHE_SIZE, config.BOOK_CACHE_TTL, backend)
+
+
+book_cache = create_book_cache()  # Read-through cache for GET /books/{book_id}
@@ -0,0 +1,224 @@
+"""Response compression with gzip, brotli or zstd, negotiated from Accept-Encoding.
+
+brotli and zstd are used only when the ``brotli`` and ``zstandard`` packages
+are installed; gzip is always available.
+"""
+import zlib
+
+import config
+
+try:
+    import brotli
+except ImportError:  # br is skipped when brotli is not installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is skipped when zstandard is not installed
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")  # Content-Type prefixes worth compressing
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16 + MAX_WBITS writes a gzip header
+
+    def compress(self, data):
+        """Compress a chunk and flush it, so streamed lines reach the client without waiting for more."""
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+CODECS = {"gzip": GzipCompressor, "br": BrotliCompressor, "zstd": ZstdCompressor}
+DEFAULT_LEVELS = {"gzip": config.GZIP_LEVEL, "br": config.BROTLI_LEVEL, "zstd": config.ZSTD_LEVEL}
+
+
+def encoded_etag(etag, encoding):
+    """Strong ETag of the ``encoding`` form of a representation: ``"1.2"`` becomes ``"1.2-gzip"``. Weak tags stay as they are."""
+    if encoding is None or etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoding(opaque):
+    """Drop the ``-<encoding>`` suffix ``encoded_etag`` adds from an unquoted tag, e.g. ``1.2-gzip`` -> ``1.2``."""
+    base, _, encoding = opaque.rpartition("-")
+    return base if base and encoding in CODECS else opaque
+
+
+def negotiate(request):
+    """The encoding CompressionMiddleware picks for ``request``, or None for identity."""
+    return choose_encoding(request.headers.get("accept-encoding", ""), available_encodings())
+
+
+def available_encodings(names=config.COMPRESSION_ENCODINGS):
+    """Return the configured encodings, in preference order, whose codec can be loaded."""
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return [name for name in (part.strip() for part in names.split(",")) if installed.get(name)]
+
+
+def choose_encoding(accept_encoding, encodings):
+    """Pick the first of ``encodings`` the Accept-Encoding header allows with a non-zero q-value."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, *params = (piece.strip() for piece in part.split(";"))
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name.lower()] = weight
+    for encoding in encodings:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses JSON and NDJSON responses.
+
+    Bodies are buffered until they reach ``min_size``, so small responses go
+    out untouched. Larger ones, including streamed NDJSON, are compressed
+    chunk by chunk as the app sends them. ``route_levels`` maps a route path
+    such as "/books/" to per-encoding levels that override the defaults.
+    Compressed responses get their own strong ETag (see ``encoded_etag``),
+    since their bytes differ from the identity representation. 304 responses
+    carry ``Vary: Accept-Encoding`` like the responses they stand for.
+    """
+
+    def __init__(self, app, min_size=config.COMPRESSION_MIN_SIZE, encodings=None, route_levels=None):
+        self.app = app
+        self.min_size = min_size
+        self.encodings = available_encodings() if encodings is None else encodings
+        self.route_levels = route_levels or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = choose_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressedResponse(self, scope, encoding, send).run(receive)
+
+    def level(self, scope, encoding):
+        route = scope.get("route")
+        levels = self.route_levels.get(route.path, {}) if route is not None else {}
+        return levels.get(encoding, DEFAULT_LEVELS[encoding])
+
+
+class CompressedResponse:
+    """State for compressing one response as its ASGI messages pass through."""
+
+    def __init__(self, middleware, scope, encoding, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start = None  # Held back until we know whether to compress
+        self.buffer = []  # Body chunks held back while below min_size
+        self.buffered = 0
+        self.compressor = None
+        self.passthrough = False
+
+    async def run(self, receive):
+        await self.middleware.app(self.scope, receive, self.on_send)
+
+    async def on_send(self, message):
+        if self.passthrough:
+            await self.send(message)
+        elif message["type"] == "http.response.start":
+            self.start = message
+            headers = {key.lower(): value for key, value in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            if message["status"] == 304:  # The app already picked the ETag of the representation the client holds
+                self.passthrough = True
+                await self.send({**message, "headers": list(message.get("headers", [])) + [(b"vary", b"Accept-Encoding")]})
+            elif (b"content-encoding" in headers or message["status"] < 200 or message["status"] == 204
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                self.passthrough = True
+                await self.send(message)
+        elif message["type"] == "http.response.body":
+            await self.on_body(message)
+        else:
+            await self.send(message)
+
+    async def on_body(self, message):
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is not None:
+            data = self.compressor.compress(body) if body else b""
+            if not more_body:
+                data += self.compressor.finish()
+            if data or not more_body:
+                await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        self.buffer.append(body)
+        self.buffered += len(body)
+        if self.buffered < self.middleware.min_size:
+            if more_body:
+                return
+            await self.send_identity(b"".join(self.buffer))  # Too small to be worth compressing
+            return
+
+        self.compressor = CODECS[self.encoding](self.middleware.level(self.scope, self.encoding))
+        await self.send(self.compressed_start())
+        data = self.compressor.compress(b"".join(self.buffer))
+        self.buffer = []
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def send_identity(self, body):
+        headers = [(key, value) for key, value in self.start.get("headers", [])]
+        headers.append((b"vary", b"Accept-Encoding"))
+        await self.send({**self.start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": body, "more_body": False})
+
+    def compressed_start(self):
+        headers = []
+        for key, value in self.start.get("headers", []):
+            name = key.lower()
+            if name == b"content-length":  # The compressed length is not known up front
+                continue
+            if name == b"etag":
+                value = encoded_etag(value.decode("latin-1"), self.encoding).encode("latin-1")
+            headers.append((key, value))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"vary", b"Accept-Encoding"))
+        return {**self.start, "headers": headers}
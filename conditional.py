@@ -0,0 +1,124 @@
+"""ETags, Last-Modified and the conditional request headers that use them.
+
+Book ETags are built from the row's ``version`` column and listing ETags
+from a summary of the rows the page covers (crud.summarise_page), so a request
+can be answered with 304 Not Modified before any response body is built.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Response
+
+import compression
+import crud
+
+
+def _fields_tag(fields):
+    """Encode a projection as a hex bitmask of crud.BOOK_FIELDS, empty for every field."""
+    if tuple(fields) == crud.BOOK_FIELDS:
+        return ""
+    mask = sum(1 << index for index, name in enumerate(crud.BOOK_FIELDS) if name in fields)
+    return f".{mask:x}"
+
+
+def book_etag(book_id, version, fields=crud.BOOK_FIELDS):
+    """Strong ETag for one book; each projection is a different representation."""
+    return f'"{book_id}.{version}{_fields_tag(fields)}"'
+
+
+def collection_etag(page_version, fields, *representation):
+    """Strong ETag for a listing: the page's row summary plus whatever else shapes the page."""
+    count, max_id, version_sum, max_updated_at = page_version
+    if max_updated_at is not None:  # Microseconds since the epoch; ETags cannot hold spaces
+        max_updated_at = round(_utc(max_updated_at).timestamp() * 1_000_000)
+    parts = (count, max_id or 0, version_sum or 0, max_updated_at or 0, *representation)
+    return '"c' + ".".join(str(part) for part in parts) + _fields_tag(fields) + '"'
+
+
+def _utc(value):
+    """Turn a stored updated_at value (a UTC datetime or ISO string) into an aware datetime."""
+    if isinstance(value, str):  # SQLite hands timestamps back as text
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:  # Connections run with time_zone UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def http_date(value):
+    """Format a stored updated_at value as an HTTP-date."""
+    return format_datetime(_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def parse_etags(header):
+    """Split an If-Match / If-None-Match value into its entity tags; ``*`` stays as is."""
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _opaque(tag):
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified_etag(request, etag, last_modified):
+    """Return the ETag to answer 304 with if the client's cached copy is current, else None.
+
+    If-None-Match takes precedence over If-Modified-Since. A compressed response
+    carries the tag of its encoding (compression.encoded_etag), so the tag of
+    the encoding this request negotiates matches too, and is the one echoed.
+    """
+    current = compression.encoded_etag(etag, compression.negotiate(request))
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:  # Weak comparison, as RFC 9110 prescribes for If-None-Match
+        tags = {_opaque(tag) for tag in parse_etags(if_none_match)}
+        if "*" in tags or current in tags:
+            return current
+        return etag if etag in tags else None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return None
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):  # An unparsable date is ignored
+        return None
+    if since.tzinfo is None:  # The asctime form and a "-0000" zone parse naive; HTTP dates are always UTC
+        since = since.replace(tzinfo=timezone.utc)
+    return etag if parsedate_to_datetime(last_modified) <= since else None
+
+
+def not_modified(etag, last_modified):
+    """Build a body-less 304 response carrying the current validators."""
+    return Response(status_code=304, headers=validators(etag, last_modified))
+
+
+def validators(etag, last_modified):
+    """ETag and Last-Modified response headers."""
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+
+def if_match_versions(request, book_id):
+    """Return the row versions an If-Match header allows for ``book_id``.
+
+    None means the header is absent or ``*`` (any existing row). Tags for other
+    books never match, so they are dropped and may leave an empty set, which no
+    version satisfies. If-Match uses strong comparison, so weak tags never
+    match; the tag of a compressed response names its row version like the
+    identity tag does.
+    """
+    header = request.headers.get("if-match")
+    if header is None:
+        return None
+    tags = parse_etags(header)
+    if "*" in tags:
+        return None
+    versions = set()
+    for tag in tags:
+        if len(tag) < 2 or tag[0] != '"' or tag[-1] != '"':  # Weak (W/"...") or malformed
+            continue
+        tag_id, _, rest = compression.strip_encoding(tag[1:-1]).partition(".")
+        version = rest.partition(".")[0]
+        if tag_id == str(book_id) and version.isdigit():
+            versions.add(int(version))
+    return versions
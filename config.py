@@ -0,0 +1,98 @@
+import os
+
+
+def _env_int(name, default):
+    """Read an integer setting from the environment, falling back to a default."""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    """Read a float setting from the environment, falling back to a default."""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    """Read a boolean setting such as 1/0, true/false or yes/no from the environment."""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# MySQL connection settings
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = _env_int("DB_PORT", 3306)
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "root")
+DB_NAME = os.getenv("DB_NAME", "book_management_db")
+
+# Storage engine (see storage.py)
+BOOKS_STORAGE = os.getenv("BOOKS_STORAGE", "mysql")  # mysql, sqlite or memory
+BOOKS_SQLITE_PATH = os.getenv("BOOKS_SQLITE_PATH", "books.db")  # Database file for the sqlite engine
+
+# Schema migrations (see migrate.py)
+DB_MIGRATE_ON_STARTUP = _env_bool("DB_MIGRATE_ON_STARTUP", False)  # Apply pending migrations/ when the app starts
+
+# Connection pool settings
+DB_POOL_MIN_SIZE = _env_int("DB_POOL_MIN_SIZE", 2)  # Connections opened eagerly when the pool starts
+DB_POOL_MAX_SIZE = _env_int("DB_POOL_MAX_SIZE", 10)  # Hard upper bound on open connections
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 5.0)  # Seconds to wait for a free connection before failing
+DB_POOL_MAX_LIFETIME = _env_float("DB_POOL_MAX_LIFETIME", 1800.0)  # Seconds before a connection is recycled
+DB_STATEMENT_CACHE_SIZE = _env_int("DB_STATEMENT_CACHE_SIZE", 64)  # Prepared statements kept per connection; 0 prepares nothing
+
+# Read replicas (see replicas.py)
+DB_REPLICA_HOSTS = os.getenv("DB_REPLICA_HOSTS", "")  # Comma-separated host[:port] list; empty sends every read to the primary
+DB_REPLICA_POOL_MIN_SIZE = _env_int("DB_REPLICA_POOL_MIN_SIZE", DB_POOL_MIN_SIZE)  # Connections opened eagerly per replica
+DB_REPLICA_POOL_MAX_SIZE = _env_int("DB_REPLICA_POOL_MAX_SIZE", DB_POOL_MAX_SIZE)  # Upper bound on open connections per replica
+DB_REPLICA_SELECTION = os.getenv("DB_REPLICA_SELECTION", "round_robin")  # round_robin or least_loaded
+DB_REPLICA_MAX_LAG = _env_float("DB_REPLICA_MAX_LAG", 5.0)  # Seconds behind the primary after which a replica stops serving reads
+DB_REPLICA_CHECK_INTERVAL = _env_float("DB_REPLICA_CHECK_INTERVAL", 5.0)  # Seconds between replication lag checks per replica
+DB_REPLICA_RETRY_AFTER = _env_float("DB_REPLICA_RETRY_AFTER", 10.0)  # Seconds an unreachable replica is left out before it is tried again
+READ_YOUR_WRITES_WINDOW = _env_float("READ_YOUR_WRITES_WINDOW", 10.0)  # Seconds a client's reads stay on the primary after its own write; 0 disables
+READ_YOUR_WRITES_COOKIE = os.getenv("READ_YOUR_WRITES_COOKIE", "books_primary")  # Cookie that carries the window between requests
+
+# Thread pool that runs blocking database calls off the event loop
+DB_EXECUTOR_WORKERS = _env_int("DB_EXECUTOR_WORKERS", DB_POOL_MAX_SIZE + DB_REPLICA_POOL_MAX_SIZE * len(  # Concurrent queries per worker process
+    [host for host in DB_REPLICA_HOSTS.split(",") if host.strip()]))
+
+# GET /books/ pagination and streaming
+BOOKS_PAGE_SIZE = _env_int("BOOKS_PAGE_SIZE", 100)  # Page size when the client does not pass limit
+BOOKS_MAX_PAGE_SIZE = _env_int("BOOKS_MAX_PAGE_SIZE", 1000)  # Largest limit accepted for a JSON page
+BOOKS_STREAM_BATCH_SIZE = _env_int("BOOKS_STREAM_BATCH_SIZE", 500)  # Rows pulled per fetchmany in NDJSON mode
+BOOKS_MAX_BATCH_IDS = _env_int("BOOKS_MAX_BATCH_IDS", 100)  # Most ids accepted by GET /books?ids=
+
+# Read-through cache for GET /books/{book_id}
+BOOK_CACHE_SIZE = _env_int("BOOK_CACHE_SIZE", 10000)  # Books kept in each worker's LRU
+BOOK_CACHE_TTL = _env_float("BOOK_CACHE_TTL", 60.0)  # Seconds a cached book stays valid
+BOOK_CACHE_REDIS_URL = os.getenv("BOOK_CACHE_REDIS_URL", "")  # Optional shared tier, e.g. redis://localhost:6379/0
+
+# /books/bulk
+BULK_INSERT_BATCH_SIZE = _env_int("BULK_INSERT_BATCH_SIZE", 1000)  # Books per multi-row INSERT and transaction
+BULK_INSERT_MAX_BATCH_SIZE = _env_int("BULK_INSERT_MAX_BATCH_SIZE", 10000)  # Largest batch_size a client may request
+BULK_WRITE_CHUNK_SIZE = _env_int("BULK_WRITE_CHUNK_SIZE", 1000)  # Books per UPDATE/DELETE statement and commit in PATCH/DELETE /books/bulk
+BULK_WRITE_MAX_CHUNK_SIZE = _env_int("BULK_WRITE_MAX_CHUNK_SIZE", 10000)  # Largest chunk_size a client may request
+
+# Group commit for POST /books/ (see batching.py); adjustable at runtime through PUT /admin/group-commit
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Bearer token for the /admin/ routes; empty turns them off
+GROUP_COMMIT_ENABLED = _env_bool("GROUP_COMMIT_ENABLED", False)  # Combine concurrent single-book inserts into one INSERT and COMMIT
+GROUP_COMMIT_WINDOW_MS = _env_float("GROUP_COMMIT_WINDOW_MS", 5.0)  # Longest a book waits for others to join its batch
+GROUP_COMMIT_MAX_ROWS = _env_int("GROUP_COMMIT_MAX_ROWS", 100)  # Batch size that is written without waiting for the window
+
+# Serialization
+FAST_JSON = _env_bool("FAST_JSON", False)  # Render /books/ responses with orjson, skipping jsonable_encoder
+
+# Slow-query log
+SLOW_QUERY_THRESHOLD_MS = _env_float("SLOW_QUERY_THRESHOLD_MS", 200.0)  # Execute plus fetch time that counts as slow; negative disables the log
+SLOW_QUERY_EXPLAIN = _env_bool("SLOW_QUERY_EXPLAIN", False)  # Also record EXPLAIN output for slow statements
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "slow_queries.log")  # JSON-lines log file
+SLOW_QUERY_LOG_MAX_BYTES = _env_int("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024)  # Size at which the log rotates
+SLOW_QUERY_LOG_BACKUPS = _env_int("SLOW_QUERY_LOG_BACKUPS", 5)  # Rotated files kept
+
+# Response compression
+COMPRESSION_MIN_SIZE = _env_int("COMPRESSION_MIN_SIZE", 1024)  # Bodies smaller than this many bytes are sent as is
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")  # Server preference; codecs whose package is missing are skipped
+GZIP_LEVEL = _env_int("GZIP_LEVEL", 6)  # Default gzip level, 1-9
+BROTLI_LEVEL = _env_int("BROTLI_LEVEL", 4)  # Default brotli quality, 0-11 (needs the brotli package)
+ZSTD_LEVEL = _env_int("ZSTD_LEVEL", 3)  # Default zstd level, 1-22 (needs the zstandard package)
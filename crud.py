@@ -0,0 +1,417 @@
+"""Blocking SQL operations on the books table.
+
+Every function takes a connection borrowed from a ``database.ConnectionPool``
+as its first argument and is meant to be run through ``connection.run`` (see
+storage.SQLRepository) so it never blocks the event loop. Cursors are opened in ``with`` blocks so they are closed on
+every path, including errors. Fixed-shape statements ask for ``prepared=True``
+cursors, which reuse a server-side prepared statement cached on the pooled
+connection (see database.StatementCache); statements whose text varies with
+the request, like IN lists and searches, use plain cursors.
+"""
+from mysql.connector import Error
+
+from database import is_duplicate_key
+
+
+class VersionConflictError(Exception):
+    """Raised when an update's expected row version no longer matches the stored one."""
+
+INSERT_BOOK_QUERY = """INSERT INTO books (title, author, genre, year_published, isbn)
+                       VALUES (%s, %s, %s, %s, %s)"""  # SQL query to insert a new book into the 'books' table
+
+
+BOOK_COLUMNS = ("title", "author", "genre", "year_published", "isbn")  # Columns a client may write
+BOOK_FIELDS = ("id",) + BOOK_COLUMNS  # Every column a client may read, in table order
+VERSION_COLUMNS = ("version", "updated_at")  # Row validators, read for ETag and Last-Modified but never sent in a body
+
+
+def select_list(fields):
+    """Return the SELECT column list for ``fields``, rejecting names outside BOOK_FIELDS."""
+    unknown = set(fields) - set(BOOK_FIELDS)
+    if unknown:  # Column names end up in the SQL text, so only whitelisted ones may pass
+        raise ValueError(f"Unknown book fields: {', '.join(sorted(unknown))}")
+    return ", ".join(fields)
+
+
+def book_params(book):
+    """Return the INSERT parameters for a validated Book."""
+    return (book.title, book.author, book.genre, book.year_published, book.isbn)
+
+
+def create_book(connection, book):
+    """Insert a new book and return its id."""
+    with connection.cursor(prepared=True) as cursor:  # Creating a cursor object to execute SQL queries
+        cursor.execute(INSERT_BOOK_QUERY, book_params(book))  # Executing the query with book data
+        connection.commit()  # Committing the transaction to save the changes
+        return cursor.lastrowid
+
+
+def create_books(connection, books):
+    """Insert a batch of books in one transaction and return one ``(id, error)`` pair per book.
+
+    executemany sends the batch as a single multi-row INSERT. If the batch is
+    rejected, it is rolled back and retried row by row so one duplicate ISBN
+    does not sink the others. ``error`` is None on success, otherwise the
+    duplicate-key IntegrityError that rejected the row, and ``id`` is then None.
+
+    Any other error during the retry (a deadlock or lock wait timeout may
+    already have rolled back the whole transaction on the server) rolls back
+    and is raised, so no book is ever reported inserted without being committed.
+    """
+    with connection.cursor() as cursor:
+        try:
+            cursor.executemany(INSERT_BOOK_QUERY, [book_params(book) for book in books])  # One multi-row INSERT for the batch
+            ids = inserted_ids(cursor, books)
+            connection.commit()
+            return [(book_id, None) for book_id in ids]
+        except Error:
+            connection.rollback()  # Nothing from the failed batch was written; find the offending rows
+
+        results = []
+        for book in books:
+            try:
+                cursor.execute(INSERT_BOOK_QUERY, book_params(book))
+                results.append((cursor.lastrowid, None))
+            except Error as e:
+                if not is_duplicate_key(e):  # The transaction may be gone; fail the whole batch
+                    connection.rollback()
+                    raise
+                results.append((None, e))  # A rejected row leaves the rest of the transaction intact
+        connection.commit()
+    return results
+
+
+def inserted_ids(cursor, books):
+    """Return the ids of books just inserted by one multi-row INSERT, in the order of ``books``.
+
+    They are read back through the unique isbn index rather than counted up from
+    ``lastrowid``, which would assume consecutive ids (auto_increment_increment = 1).
+    """
+    if len(books) == 1:
+        return [cursor.lastrowid]
+    isbns = [book.isbn for book in books]
+    cursor.execute(f"SELECT isbn, id FROM books WHERE isbn IN ({', '.join(['%s'] * len(isbns))})", isbns)
+    ids = dict(cursor.fetchall())
+    return [ids[isbn] for isbn in isbns]
+
+
+def row_to_book(row, columns=BOOK_FIELDS):
+    """Map a books row to a dictionary keyed by the selected column names."""
+    return dict(zip(columns, row))
+
+
+def summarise_page(keys):
+    """Summarise a listing page's ``(id, version, updated_at)`` keys as ``(count, max_id, version_sum, max_updated_at)``.
+
+    The keys cover the page plus the row after it, which decides next_cursor.
+    An update moves max_updated_at, an insert into the page moves count, and a
+    delete moves count or, as the page slides forward, max_id; so the summary
+    changes whenever the page would, without any shared counter row.
+    """
+    count, max_id, version_sum, max_updated_at = 0, None, None, None
+    for book_id, version, updated_at in keys:
+        count += 1
+        max_id = book_id if max_id is None else max(max_id, book_id)
+        version_sum = version if version_sum is None else version_sum + version
+        max_updated_at = updated_at if max_updated_at is None else max(max_updated_at, updated_at)
+    return count, max_id, version_sum, max_updated_at
+
+
+def list_books(connection, after_id, limit, fields=BOOK_FIELDS):
+    """Fetch up to ``limit`` books with an id greater than ``after_id``, in id order.
+
+    Only the columns in ``fields`` are read, plus the keys summarise_page needs.
+    Returns the column names, the raw row tuples, a flag telling whether more
+    books follow the page, and the page's summary, which is read with the
+    rows so it always describes exactly this body.
+    """
+    query = (f"SELECT {select_list(fields)}, id, {', '.join(VERSION_COLUMNS)} FROM books"
+             " WHERE id > %s ORDER BY id LIMIT %s")  # Keyset query that walks the primary key index
+    with connection.cursor(prepared=True) as cursor:  # Creating a cursor object to execute SQL queries
+        cursor.execute(query, (after_id, limit + 1))  # Asking for one extra row to learn whether another page exists
+        result = cursor.fetchall()  # Fetching the page
+        columns = cursor.column_names[:-3]
+    return columns, [row[:-3] for row in result[:limit]], len(result) > limit, summarise_page(row[-3:] for row in result)
+
+
+def open_book_stream(connection, after_id, limit=None, fields=BOOK_FIELDS):
+    """Start an unbuffered query over the books after ``after_id`` and return its cursor.
+
+    Rows are pulled with ``cursor.fetchmany`` as they are needed; the caller
+    must hand the cursor to ``close_book_stream`` when done.
+    """
+    query = f"SELECT {select_list(fields)} FROM books WHERE id > %s ORDER BY id"
+    cursor = connection.cursor()  # Unbuffered cursor, so rows stay on the server until fetched
+    try:
+        if limit is None:
+            cursor.execute(query, (after_id,))
+        else:
+            cursor.execute(query + " LIMIT %s", (after_id, limit))
+    except Error:
+        cursor.close()
+        raise
+    return cursor
+
+
+def fetch_batch(connection, cursor, size):
+    """Pull the next ``size`` rows from a cursor opened by ``open_book_stream``."""
+    return cursor.fetchmany(size)
+
+
+def close_book_stream(connection, cursor):
+    """Close a cursor from ``open_book_stream``, draining rows the client never read."""
+    if connection.unread_result:  # The client went away mid-stream
+        connection.consume_results()
+    cursor.close()
+
+
+def filter_conditions(genre=None, author=None, isbn=None, year_from=None, year_to=None):
+    """Build the exact-match and range conditions shared by search and bulk changes."""
+    conditions, params = [], []
+    for column, value in (("genre", genre), ("author", author), ("isbn", isbn)):
+        if value is not None:
+            conditions.append(f"{column} = %s")
+            params.append(value)
+    if year_from is not None:
+        conditions.append("year_published >= %s")
+        params.append(year_from)
+    if year_to is not None:
+        conditions.append("year_published <= %s")
+        params.append(year_to)
+    return conditions, params
+
+
+def build_search_query(q=None, title=None, author=None, genre=None, isbn=None, year_from=None, year_to=None):
+    """Build the SQL and parameters for a book search.
+
+    Text terms use FULLTEXT MATCH ... AGAINST, whose summed scores rank the
+    results; genre, isbn and the year range are B-tree filters.
+    """
+    conditions, params = [], []
+    scores, score_params = [], []
+    for text, columns in ((q, "title, author"), (title, "title"), (author, "author")):
+        if text:
+            match = f"MATCH({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)"  # Served by the FULLTEXT index on exactly these columns
+            conditions.append(match)
+            params.append(text)
+            scores.append(match)
+            score_params.append(text)
+    exact, exact_params = filter_conditions(genre=genre, isbn=isbn, year_from=year_from, year_to=year_to)
+    conditions += exact
+    params += exact_params
+
+    if scores:
+        query = f"SELECT {select_list(BOOK_FIELDS)}, {' + '.join(scores)} AS relevance FROM books"
+    else:
+        query = f"SELECT {select_list(BOOK_FIELDS)} FROM books"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY relevance DESC, id" if scores else " ORDER BY id"
+    return query, score_params + params
+
+
+def search_books(connection, limit, offset, **filters):
+    """Return one page of books matching ``filters``, best matches first when searching text."""
+    query, params = build_search_query(**filters)
+    with connection.cursor() as cursor:  # Creating a cursor object to execute SQL queries
+        cursor.execute(query + " LIMIT %s OFFSET %s", (*params, limit, offset))
+        result = cursor.fetchall()
+        columns = cursor.column_names
+
+    books = []
+    for row in result:
+        book = row_to_book(row, columns)
+        if "relevance" in book:  # Text searches carry their relevance score after the book columns
+            book["relevance"] = float(book["relevance"])
+        books.append(book)
+    return books
+
+
+def explain_search(connection, **filters):
+    """Return MySQL's EXPLAIN output for a search, one dictionary per plan row."""
+    query, params = build_search_query(**filters)
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN " + query, params)
+        return [dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+
+
+def full_table_scans(plan):
+    """Return the EXPLAIN rows that read the whole table: access type ALL, or index for a full index scan."""
+    return [row for row in plan if row.get("type") in ("ALL", "index")]
+
+
+def get_versioned_book(connection, book_id, fields=BOOK_FIELDS):
+    """Fetch the ``fields`` of a book with its validators as ``(book, version, updated_at)``, or None."""
+    query = f"SELECT {select_list(fields)}, {', '.join(VERSION_COLUMNS)} FROM books WHERE id = %s"
+    with connection.cursor(prepared=True) as cursor:
+        cursor.execute(query, (book_id,))
+        result = cursor.fetchone()
+
+    if result is None:
+        return None
+    *row, version, updated_at = result
+    return row_to_book(row, fields), version, updated_at
+
+
+def get_versioned_books(connection, book_ids, fields=BOOK_FIELDS):
+    """Fetch many books with one IN query, as ``{id: (book, version, updated_at)}``; missing ids are absent."""
+    if not book_ids:
+        return {}
+    columns = fields if "id" in fields else ("id",) + tuple(fields)  # The id maps rows back to the request
+    placeholders = ", ".join(["%s"] * len(book_ids))
+    query = f"SELECT {select_list(columns)}, {', '.join(VERSION_COLUMNS)} FROM books WHERE id IN ({placeholders})"
+    with connection.cursor() as cursor:
+        cursor.execute(query, tuple(book_ids))  # One primary key range lookup for the whole batch
+        result = cursor.fetchall()
+
+    books = {}
+    for *row, version, updated_at in result:
+        book = row_to_book(row, columns)
+        book_id = book["id"] if "id" in fields else book.pop("id")
+        books[book_id] = (book, version, updated_at)
+    return books
+
+
+def get_book_by_isbn(connection, isbn):
+    """Fetch a single book through the unique isbn index, or None if it does not exist."""
+    with connection.cursor(prepared=True) as cursor:  # Creating a cursor object to execute SQL queries
+        cursor.execute(f"SELECT {select_list(BOOK_FIELDS)} FROM books WHERE isbn = %s", (isbn,))  # Single-row lookup on uq_books_isbn
+        result = cursor.fetchone()
+    return row_to_book(result) if result is not None else None
+
+
+def book_version(connection, book_id):
+    """Return the stored version of a book, or None if it does not exist."""
+    with connection.cursor(prepared=True) as cursor:
+        cursor.execute("SELECT version FROM books WHERE id = %s", (book_id,))  # Primary key probe, no book data read
+        result = cursor.fetchone()
+    return result[0] if result is not None else None
+
+
+def check_unchanged(connection, book_id, versions):
+    """Tell "unchanged" from "not found" or a version conflict after an update wrote nothing."""
+    version = book_version(connection, book_id)
+    if version is None:
+        return False, False
+    if versions is not None and version not in versions:
+        raise VersionConflictError(f"Book {book_id} is at version {version}")
+    return True, False
+
+
+def changed_condition(columns):
+    """WHERE clause true when any of ``columns`` differs from its %s parameter, byte for byte.
+
+    A plain ``<>`` follows the column collation, and utf8mb4_0900_ai_ci treats
+    "dune" and "Dune" (or "Café" and "Cafe") as equal, which would drop real
+    edits. Comparing HEX() of both sides compares the stored bytes and reads the
+    same on MySQL and SQLite. The columns are NOT NULL, so no NULL handling is needed.
+    """
+    return " OR ".join(f"HEX({column}) <> HEX(%s)" for column in columns)
+
+
+def update_book(connection, book_id, changes, versions=None):
+    """Write only the columns in ``changes`` and return ``(found, changed)``.
+
+    The WHERE clause skips rows that already hold every new value, so a no-op
+    update takes no row write and touches no index; only then is a primary
+    key probe needed to tell "unchanged" from "not found". When ``versions`` is
+    given (from If-Match), the row is only written at one of those versions and
+    VersionConflictError is raised otherwise.
+    """
+    changes = {column: value for column, value in changes.items() if column in BOOK_COLUMNS}
+    if not changes or versions == set():  # Nothing to write, or no version the client sent can match
+        return check_unchanged(connection, book_id, versions)
+
+    assignments = ", ".join(f"{column} = %s" for column in changes)  # SET clause built only from the provided fields
+    differs = changed_condition(changes)  # True when at least one value actually changes
+    query = f"UPDATE books SET {assignments}, version = version + 1 WHERE id = %s AND ({differs})"
+    values = tuple(changes.values())
+    params = (*values, book_id, *values)
+    if versions is not None:  # Optimistic concurrency: only write the version the client last saw
+        query += f" AND version IN ({', '.join(['%s'] * len(versions))})"
+        params += tuple(sorted(versions))
+    with connection.cursor(prepared=True) as cursor:  # Creating a cursor object to execute SQL queries
+        cursor.execute(query, params)  # Executing the update query
+        connection.commit()  # Committing the transaction to save the changes
+        rowcount = cursor.rowcount
+
+    if rowcount:
+        return True, True
+    return check_unchanged(connection, book_id, versions)
+
+
+def delete_book(connection, book_id):
+    """Delete a book and return the number of affected rows."""
+    query = "DELETE FROM books WHERE id = %s"  # SQL query to delete a book by its ID
+    with connection.cursor(prepared=True) as cursor:  # Creating a cursor object to execute SQL queries
+        cursor.execute(query, (book_id,))  # Executing the delete query
+        connection.commit()  # Committing the transaction to delete the book
+        return cursor.rowcount
+
+
+def _bulk_chunks(cursor, chunk_size, ids, filters, missing):
+    """Yield the existing ids of a bulk selection, at most ``chunk_size`` at a time.
+
+    Explicit ids are checked chunk by chunk and the absent ones are appended to
+    ``missing``. A filter is walked in primary key order, so each chunk is a
+    short keyset query and rows the change moves out of the filter are not
+    revisited. Each chunk is selected FOR UPDATE, so its rows stay as selected
+    (still there, still matching the filter) until the caller commits the
+    chunk's write.
+    """
+    if ids is not None:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            cursor.execute(f"SELECT id FROM books WHERE id IN ({', '.join(['%s'] * len(chunk))}) FOR UPDATE", tuple(chunk))
+            existing = {row[0] for row in cursor.fetchall()}
+            missing.extend(book_id for book_id in chunk if book_id not in existing)
+            if existing:
+                yield [book_id for book_id in chunk if book_id in existing]
+        return
+
+    conditions, params = filter_conditions(**filters)
+    query = f"SELECT id FROM books WHERE {' AND '.join(conditions)} AND id > %s ORDER BY id LIMIT %s FOR UPDATE"
+    after_id = 0
+    while True:
+        cursor.execute(query, (*params, after_id, chunk_size))
+        chunk = [row[0] for row in cursor.fetchall()]
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1]
+
+
+def bulk_update_books(connection, changes, chunk_size, ids=None, filters=None):
+    """Apply ``changes`` to the books chosen by ``ids`` or ``filters``, committing once per chunk.
+
+    Returns ``(matched_ids, updated, missing_ids)``; ``updated`` counts only the
+    rows whose values actually changed.
+    """
+    changes = {column: value for column, value in changes.items() if column in BOOK_COLUMNS}
+    assignments = ", ".join(f"{column} = %s" for column in changes)
+    differs = changed_condition(changes)  # Rows that already hold every value are skipped, as in update_book
+    values = tuple(changes.values())
+    matched, missing, updated = [], [], 0
+    with connection.cursor() as cursor:
+        for chunk in _bulk_chunks(cursor, chunk_size, ids, filters, missing):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"UPDATE books SET {assignments}, version = version + 1 WHERE id IN ({placeholders}) AND ({differs})",
+                           (*values, *chunk, *values))  # One set-based statement per chunk
+            updated += cursor.rowcount
+            connection.commit()  # Keeping transactions, locks and undo small on long jobs
+            matched.extend(chunk)
+    return matched, updated, missing
+
+
+def bulk_delete_books(connection, chunk_size, ids=None, filters=None):
+    """Delete the books chosen by ``ids`` or ``filters``, committing once per chunk.
+
+    Returns ``(deleted_ids, missing_ids)``.
+    """
+    deleted, missing = [], []
+    with connection.cursor() as cursor:
+        for chunk in _bulk_chunks(cursor, chunk_size, ids, filters, missing):
+            cursor.execute(f"DELETE FROM books WHERE id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+            connection.commit()
+            deleted.extend(chunk)
+    return deleted, missing
@@ -1,18 +1,502 @@
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
+
+import config
+import metrics
+import slow_query
+
 
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
 
-def create_connection():
-    """Establish a connection to the MySQL database."""
+
+def create_connection(host=config.DB_HOST, port=config.DB_PORT):
+    """Establish a connection to the MySQL database, the primary unless a replica's host is given."""
     try:
         connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='root',
-            database='book_management_db'
+            host=host,
+            port=port,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_NAME,
+            time_zone="+00:00"  # TIMESTAMP columns come back in UTC, as Last-Modified expects
         )
         if connection.is_connected():
             return connection
     except Error as e:
         print(f"Error: {e}")
         return None
+
+
+def is_duplicate_key(error):
+    """Whether a MySQL error was caused by a unique index rejecting a duplicate value."""
+    return getattr(error, "errno", None) == errorcode.ER_DUP_ENTRY
+
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+def normalize_sql(query):
+    """Collapse whitespace and placeholder lists so one statement shape gets one label."""
+    return _PLACEHOLDER_LIST.sub("%s, ...", _WHITESPACE.sub(" ", query).strip())
+
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")  # Statements MySQL can EXPLAIN
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that records execute and fetch timings for each statement.
+
+    A statement's execute and fetch time are added up until the next execute
+    or close, and statements over the slow-query threshold are logged.
+    """
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+        self._statement = None
+        self._query = None
+        self._params = None
+        self._elapsed = 0.0
+        self._rows = None  # Rows fetched so far, None until the first fetch
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _start(self, query, params):
+        self._drain()
+        self._finish()
+        self._statement = normalize_sql(query)
+        self._query, self._params = query, params
+        self._elapsed, self._rows = 0.0, None
+
+    def _drain(self):
+        """Read what is left of the last result, so the connection is free for an EXPLAIN."""
+        if self._statement is not None and self._connection.unread_result:  # E.g. the end of a result read with fetchone
+            self._cursor.fetchall()
+
+    def _finish(self):
+        """Log the previous statement if it was slow."""
+        if self._statement is None or not slow_query.is_slow(self._elapsed):
+            return
+        rows = self._rows
+        if rows is None:
+            rows = getattr(self._cursor, "rowcount", None)
+        plan = None
+        if config.SLOW_QUERY_EXPLAIN and self._params is not None and self._statement.upper().startswith(EXPLAINABLE):
+            plan = self._explain()
+        slow_query.log_slow_query(self._statement, self._params, self._elapsed, rows, plan)
+        self._statement = None
+
+    def _explain(self):
+        try:
+            cursor = self._connection.cursor()
+            cursor.execute("EXPLAIN " + self._query, self._params)
+            plan = [dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+            cursor.close()
+            return plan
+        except Error as e:
+            return {"error": str(e)}
+
+    def execute(self, query, params=()):
+        self._start(query, params)
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._elapsed += elapsed
+            metrics.record_query(self._statement, elapsed)
+
+    def executemany(self, query, seq_params):
+        self._start(query, None)  # Batches are logged by shape only, without parameters or a plan
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._elapsed += elapsed
+            metrics.record_query(self._statement, elapsed)
+
+    def _fetched(self, started, count):
+        elapsed = time.perf_counter() - started
+        self._elapsed += elapsed
+        self._rows = (self._rows or 0) + count
+        metrics.record_fetch(self._statement, elapsed, count)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def close(self):
+        self._drain()
+        self._finish()
+        return self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StatementCache:
+    """Server-side prepared statements kept open on one connection, least recently used closed first.
+
+    mysql.connector only skips re-preparing when a prepared cursor is executed
+    with the very string object it was prepared with, so each entry keeps that
+    string next to its cursor.
+    """
+
+    def __init__(self, connection, max_size):
+        self._connection = connection
+        self.max_size = max_size
+        self._statements = OrderedDict()  # SQL text -> (the same text as prepared, prepared cursor), least recently used first
+
+    def get(self, query):
+        """Return ``(query, cursor)`` for a statement, preparing it on first use."""
+        entry = self._statements.get(query)
+        if entry is not None:
+            self._statements.move_to_end(query)
+            metrics.db_prepared_statements.inc("hit")
+            return entry
+        entry = self._statements[query] = (query, self._connection.cursor(prepared=True))
+        metrics.db_prepared_statements.inc("miss")
+        while len(self._statements) > self.max_size:
+            _, (_, cursor) = self._statements.popitem(last=False)
+            cursor.close()  # Deallocates the statement on the server
+            metrics.db_prepared_statements.inc("eviction")
+        return entry
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class PreparedCursor:
+    """Cursor that runs each statement through a StatementCache.
+
+    Closing it drains any rows left unread but keeps the statement prepared
+    for the connection's next borrower.
+    """
+
+    def __init__(self, statements, connection):
+        self._statements = statements
+        self._connection = connection
+        self._cursor = None  # The cached prepared cursor of the last statement executed
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, query, params=()):
+        query, self._cursor = self._statements.get(query)
+        return self._cursor.execute(query, params)
+
+    def close(self):
+        if self._cursor is not None and self._connection.unread_result:  # E.g. the end of a result read with fetchone
+            self._cursor.fetchall()
+        self._cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PooledConnection:
+    """A MySQL connection checked out of a ConnectionPool."""
+
+    def __init__(self, connection, pool):
+        self._connection = connection
+        self._pool = pool
+        self.created_at = time.monotonic()
+        self._pending = None  # Future of the last call made through run()
+        self.statements = StatementCache(connection, pool.statement_cache_size) if pool.statement_cache_size else None
+
+    def __getattr__(self, name):
+        # Anything not defined here (cursor, commit, rollback, ...) goes to the real connection
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, prepared=False, **kwargs):
+        """Open a cursor whose queries are recorded in metrics.
+
+        With ``prepared=True`` the statements are prepared once per connection
+        and reused from its StatementCache; a plain cursor is used when the
+        pool's cache is disabled.
+        """
+        if prepared and self.statements is not None:
+            return InstrumentedCursor(PreparedCursor(self.statements, self._connection), self._connection)
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._connection)
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func(connection, *args, **kwargs)`` on the database executor.
+
+        The call is remembered so that ``ConnectionPool.release_soon`` waits for
+        it even when the awaiting request is cancelled mid-query.
+        """
+        future = submit_db(func, self, *args, **kwargs)
+        self._pending = future
+        return await future
+
+    def reset(self):
+        """Drain unread rows and roll back any open transaction before reuse."""
+        if self._connection.unread_result:
+            self._connection.consume_results()
+        if self._connection.in_transaction:  # Also ends read snapshots, so the next borrower sees fresh data
+            self._connection.rollback()
+
+    @property
+    def expired(self):
+        """Whether the connection has outlived the pool's maximum lifetime."""
+        return time.monotonic() - self.created_at >= self._pool.max_lifetime
+
+    def close(self):
+        """Close the underlying MySQL connection for good."""
+        try:
+            self._connection.close()
+        except Error:
+            pass
+
+
+class ConnectionPool:
+    """A bounded pool of MySQL connections.
+
+    Connections are health-checked when borrowed and recycled once they exceed
+    ``max_lifetime`` seconds. ``acquire`` blocks for up to ``timeout`` seconds
+    when all ``max_size`` connections are in use. Each connection keeps up to
+    ``statement_cache_size`` prepared statements (0 disables the cache).
+    """
+
+    def __init__(self, min_size=config.DB_POOL_MIN_SIZE, max_size=config.DB_POOL_MAX_SIZE,
+                 timeout=config.DB_POOL_TIMEOUT, max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                 connect=create_connection, statement_cache_size=config.DB_STATEMENT_CACHE_SIZE):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.statement_cache_size = statement_cache_size
+        self._connect = connect
+        self._idle = deque()
+        self._size = 0  # Open connections, idle or checked out
+        self.opened = 0  # Connections opened over the pool's lifetime, including replacements
+        self._condition = threading.Condition()
+
+    def open(self):
+        """Eagerly open ``min_size`` connections."""
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._new_connection()
+            except Error:
+                with self._condition:
+                    self._size -= 1
+                return  # The database is not reachable yet; connections will be opened on demand
+            self.release(connection)
+
+    def close(self):
+        """Close every idle connection. Checked-out connections are closed when released."""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for connection in idle:
+            connection.close()
+
+    def _new_connection(self):
+        raw = self._connect()
+        if raw is None:
+            raise Error("Database connection failed")
+        with self._condition:
+            self.opened += 1
+        return PooledConnection(raw, self)
+
+    def discard(self, connection):
+        """Close a checked-out connection instead of returning it to the pool."""
+        connection.close()
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def acquire(self, timeout=None):
+        """Borrow a healthy connection, opening a new one if the pool has room.
+
+        Waits up to ``timeout`` seconds (the pool's checkout timeout by default)
+        for a connection to be released.
+        """
+        started = time.perf_counter()
+        try:
+            return self._acquire(self.timeout if timeout is None else timeout)
+        finally:
+            metrics.record_acquire(time.perf_counter() - started)
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            connection = None
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    connection = self._idle.pop()
+                else:
+                    self._size += 1  # Reserve a slot before connecting outside the lock
+
+            if connection is None:
+                try:
+                    return self._new_connection()
+                except Error:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            if connection.expired or not connection.is_connected():  # Health check on borrow
+                self.discard(connection)
+                continue
+            return connection
+
+    async def acquire_async(self):
+        """Borrow a connection from async code without blocking the event loop.
+
+        If the caller is cancelled while the checkout is in progress, the
+        connection is returned to the pool as soon as the checkout finishes.
+        """
+        submitted = time.monotonic()
+
+        def checkout():
+            return self.acquire(self.timeout - (time.monotonic() - submitted))  # Time spent queued counts against the timeout
+
+        # Checkouts wait on their own threads: if they shared the query executor, waiting
+        # checkouts could occupy every thread and starve the queries and releases that
+        # would free a connection.
+        future = asyncio.get_running_loop().run_in_executor(checkout_executor, contextvars.copy_context().run, checkout)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._release_orphan)
+            raise
+
+    def _release_orphan(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.release_soon(future.result())
+
+    def release(self, connection):
+        """Return a connection to the pool after resetting it; drop it if it has expired or is broken."""
+        if connection.expired:
+            self.discard(connection)
+            return
+        try:
+            connection.reset()
+        except Error:
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def release_soon(self, connection, cleanup=None):
+        """Schedule ``cleanup(connection)`` and the release on the database executor.
+
+        Nothing is awaited, so this is safe in ``finally`` blocks of cancelled
+        requests. The release waits for any call still running through
+        ``connection.run``, so a connection is never used by two threads at once.
+        """
+        def release():
+            try:
+                if cleanup is not None:
+                    cleanup(connection)
+            except Error:
+                self.discard(connection)
+                return
+            self.release(connection)
+
+        def schedule(_=None):
+            executor.submit(release)
+
+        pending = connection._pending
+        if pending is not None and not pending.done():
+            pending.add_done_callback(schedule)
+        else:
+            schedule()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block."""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def stats(self):
+        """Return a snapshot of pool usage."""
+        with self._condition:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle),
+                    "max_size": self.max_size, "opened": self.opened}
+
+
+pool = ConnectionPool()  # Shared pool used by the API
+monitored_pool = None  # Pool reported on /metrics; storage.SQLRepository.open points it at the open engine's pool
+
+
+def _pool_metrics():
+    if monitored_pool is None:  # No SQL engine open, e.g. the memory engine
+        return []
+    stats = monitored_pool.stats()
+    lines = ["# HELP books_db_pool_connections Pooled database connections by state.",
+             "# TYPE books_db_pool_connections gauge"]
+    lines += [f'books_db_pool_connections{{state="{state}"}} {stats[state]}' for state in ("idle", "in_use")]
+    return lines
+
+
+metrics.register_collector(_pool_metrics)
+executor = ThreadPoolExecutor(max_workers=config.DB_EXECUTOR_WORKERS, thread_name_prefix="db")  # Dedicated threads for blocking queries
+checkout_executor = ThreadPoolExecutor(max_workers=config.DB_EXECUTOR_WORKERS, thread_name_prefix="db-checkout")  # Threads that wait for pooled connections
+
+
+def submit_db(func, *args, **kwargs):
+    """Start a blocking database call on the database executor and return its asyncio future.
+
+    The caller's context variables (such as the request's metrics timings) are
+    visible to ``func``.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return loop.run_in_executor(executor, partial(context.run, func, *args, **kwargs))
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the database executor without blocking the event loop."""
+    return await submit_db(func, *args, **kwargs)
@@ -1,108 +1,463 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hmac
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
 
-from database import create_connection
-from models import Book, BookUpdate
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 
-app = FastAPI() # Creating a FastAPI instance
+import compression
+import conditional
+import config
+import crud
+import metrics
+import replicas
+from cache import book_cache
+from database import executor, run_db
+from models import Book, BookUpdate, BulkSelection, BulkUpdate, GroupCommitSettings
+from pagination import InvalidCursorError, decode_cursor, encode_cursor
+from serialization import FastJSONResponse, encode_ndjson, rows_to_books
+from storage import DuplicateBookError, StorageUnavailableError, UnsupportedSearchError, VersionConflictError, repository
 
-@app.post("/books/")  # Route to handle POST requests for adding a new book
+
+@asynccontextmanager
+async def lifespan(app):  # Opening the storage engine before the first request and closing it after the last
+    repository.open()  # Warming up the storage engine, e.g. the connection pool
+    try:
+        yield
+    finally:
+        if repository.batcher is not None:  # Writing books still waiting in a group commit batch
+            await repository.batcher.drain()
+        repository.close()  # Releasing the storage engine's connections
+
+
+app = FastAPI(lifespan=lifespan) # Creating a FastAPI instance
+app.add_middleware(metrics.TimingMiddleware)  # Timing every request per route and adding Server-Timing headers
+app.add_middleware(replicas.ReadYourWritesMiddleware)  # Keeping a client's reads on the primary right after its writes
+app.add_middleware(compression.CompressionMiddleware, route_levels={  # Compressing large JSON and NDJSON bodies
+    "/books/": {"gzip": 6, "br": 5, "zstd": 6},  # Big pages and streams of repetitive keys: favour ratio
+    "/books": {"gzip": 6, "br": 5, "zstd": 6},  # The same listing without the trailing slash
+    "/books/search": {"gzip": 4, "br": 4, "zstd": 3},
+    "/metrics": {"gzip": 1, "br": 1, "zstd": 1},  # Scraped often; keep it cheap
+})
+
+
+@app.exception_handler(StorageUnavailableError)
+async def storage_unavailable(request, exc):  # The database is unreachable or every connection is busy
+    return JSONResponse(status_code=500, content={"detail": "Database connection failed"})
+
+
+def json_response(content, headers=None, status_code=200):
+    """Wrap book route content in FastJSONResponse when FAST_JSON is enabled."""
+    if config.FAST_JSON:
+        return FastJSONResponse(content, status_code=status_code, headers=headers)
+    if headers or status_code != 200:  # Returning a response object is the only way to attach headers alongside plain content
+        return JSONResponse(jsonable_encoder(content), status_code=status_code, headers=headers)
+    return content
+
+
+def parse_fields(fields, required=()):
+    """Turn a ``fields=title,author`` query value into book columns in table order.
+
+    None means every column. Unknown names are a 400; ``required`` columns are
+    always included.
+    """
+    if fields is None:
+        return crud.BOOK_FIELDS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(crud.BOOK_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"fields must be a comma-separated subset of: {', '.join(crud.BOOK_FIELDS)}")
+    requested.update(required)
+    return tuple(name for name in crud.BOOK_FIELDS if name in requested)
+
+
+def parse_ids(ids):
+    """Turn an ``ids=3,1,2`` query value into distinct book ids, keeping their order."""
+    try:
+        book_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not book_ids:
+        raise HTTPException(status_code=400, detail="ids must name at least one book")
+    if len(book_ids) > config.BOOKS_MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {config.BOOKS_MAX_BATCH_IDS} ids may be requested at once")
+    return book_ids
+
+
+async def run_cache(func, *args):
+    """Call a book_cache method, moving it off the event loop when a shared backend means network I/O."""
+    if book_cache.backend is None:
+        return func(*args)
+    return await run_db(func, *args)
+
+
+replica_lagging = {}  # Book id -> time.monotonic() by which every replica is sure to have this worker's last write to it
+
+
+def cache_readable():
+    """Whether the current request may be answered from the book cache.
+
+    A client that just wrote must see the primary; a copy another worker
+    cached from a replica may predate the write.
+    """
+    return not replicas.read_from_primary.get()
+
+
+def cache_fillable(book_id):
+    """Whether a row just read for ``book_id`` may go into the book cache.
+
+    Primary reads always may. A replica read may only once the replicas are
+    known to be past this worker's last write to the book.
+    """
+    if replicas.read_from_primary.get() or not replicas.router.staleness:
+        return True
+    deadline = replica_lagging.get(book_id)
+    return deadline is None or deadline <= time.monotonic()
+
+
+def forget_writes(book_ids, deadline):
+    for book_id in book_ids:
+        if replica_lagging.get(book_id) == deadline:  # Not written again since
+            del replica_lagging[book_id]
+
+
+async def invalidate_books(book_ids):
+    """Drop cached copies of changed books, then again once the replicas have caught up.
+
+    Replica reads of these books are kept out of the cache until then. The
+    second pass removes a stale row cached meanwhile by a worker that did not
+    see the write, e.g. through a shared cache backend.
+    """
+    await run_cache(book_cache.invalidate_many, book_ids)
+    staleness = replicas.router.staleness
+    if staleness:
+        deadline = time.monotonic() + staleness
+        replica_lagging.update(dict.fromkeys(book_ids, deadline))
+        loop = asyncio.get_running_loop()
+        loop.call_later(staleness, forget_writes, book_ids, deadline)
+        loop.call_later(staleness, executor.submit, book_cache.invalidate_many, book_ids)
+
+
+@app.post("/books/", status_code=201)  # Route to handle POST requests for adding a new book
 async def create_book(book: Book):  # The function to create a new book. The book data is validated using the Book model.
     try:
-        connection = create_connection()  # Establishing a connection to the database
-        if not connection:  # Checking if the connection was successful
-            raise HTTPException(status_code=500, detail="Database connection failed")  # Raising an error if connection failed
-
-        cursor = connection.cursor()  # Creating a cursor object to execute SQL queries
-        query = """INSERT INTO books (title, author, genre, year_published, isbn) 
-                   VALUES (%s, %s, %s, %s, %s)"""  # SQL query to insert a new book into the 'books' table
-        cursor.execute(query, (book.title, book.author, book.genre, book.year_published, book.isbn))  # Executing the query with book data
-        connection.commit()  # Committing the transaction to save the changes
-        cursor.close()  # Closing the cursor
-        connection.close()  # Closing the database connection
-        return {"message": "Book added successfully"}  # Returning a success message
+        book_id = await repository.create_book(book)  # Inserting the book through the storage engine, which hands back the generated id
+    except DuplicateBookError:  # The unique isbn index rejected the insert
+        raise HTTPException(status_code=409, detail="A book with this ISBN already exists")
     except ValueError as e:  # Handling any validation errors
         raise HTTPException(status_code=400, detail=str(e))  # Raising an HTTP 400 error with the exception message
 
+    created = {"id": book_id, **book.model_dump()}  # The stored row is the validated payload plus its id, so no re-select is needed
+    headers = {"Location": f"/books/{book_id}", "ETag": conditional.book_etag(book_id, 1)}  # New rows start at version 1
+    return json_response(created, headers, status_code=201)
+
+
+def id_ranges(ids):
+    """Collapse ids into ``[first, last]`` runs of consecutive values, e.g. [1, 2, 3, 7] -> [[1, 3], [7, 7]]."""
+    ranges = []
+    for book_id in sorted(ids):
+        if ranges and book_id == ranges[-1][1] + 1:
+            ranges[-1][1] = book_id
+        else:
+            ranges.append([book_id, book_id])
+    return ranges
+
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+async def iter_bulk_items(request):
+    """Yield (index, item) pairs from a JSON array body or, incrementally, from an NDJSON body."""
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:  # NDJSON is parsed line by line as the body arrives
+        index, buffer = 0, b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+        return
+
+    try:
+        items = json.loads(await request.body())  # A JSON array has to be read whole
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def validation_message(error):
+    """Flatten a pydantic ValidationError into one line for the bulk error report."""
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'book'}: {e['msg']}" for e in error.errors())
+
+
+@app.post("/books/bulk")  # Route to handle POST requests for importing many books at once
+async def create_books_bulk(
+    request: Request,
+    batch_size: int = Query(config.BULK_INSERT_BATCH_SIZE, ge=1, le=config.BULK_INSERT_MAX_BATCH_SIZE),  # Books per INSERT and commit
+):  # Function to insert a JSON array or NDJSON stream of books in batched transactions
+    errors = []  # Per-row report of books that were not inserted
+    ids = []  # Generated ids of the inserted books
+    batch = []  # (index, Book) pairs waiting to be inserted
+
+    async def flush():
+        results = await repository.create_books([book for _, book in batch])  # One transaction per batch
+        for (index, _), (book_id, error) in zip(batch, results):
+            if error is None:
+                ids.append(book_id)
+            else:
+                errors.append({"index": index, "error": error})
+        batch.clear()
+
+    async for index, item in iter_bulk_items(request):
+        try:
+            if isinstance(item, bytes):  # NDJSON lines are decoded one at a time
+                item = json.loads(item)
+            batch.append((index, Book.model_validate(item)))  # Validating the payload with the Book model
+        except ValidationError as e:
+            errors.append({"index": index, "error": validation_message(e)})
+        except ValueError:
+            errors.append({"index": index, "error": "Invalid JSON"})
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    errors.sort(key=lambda e: e["index"])
+    return {"inserted": len(ids), "ids": id_ranges(ids), "failed": len(errors), "errors": errors}  # Returning the per-row report
+
+
+def bulk_selection(selection):
+    """Keyword arguments for the repository's bulk methods from a validated BulkSelection."""
+    if selection.ids is not None:
+        return {"ids": list(dict.fromkeys(selection.ids))}  # Dropping repeated ids, keeping their order
+    return {"filters": selection.filter.model_dump(exclude_none=True)}
+
+
+@app.patch("/books/bulk")  # Route to handle PATCH requests for changing many books at once
+async def update_books_bulk(
+    body: BulkUpdate,
+    chunk_size: int = Query(config.BULK_WRITE_CHUNK_SIZE, ge=1, le=config.BULK_WRITE_MAX_CHUNK_SIZE),  # Books per UPDATE and commit
+):  # Function to apply the same changes to a list of ids or every book matching a filter
+    changes = body.changes.model_dump(exclude_unset=True, exclude_none=True)  # Only the fields the client actually sent
+    matched, updated, missing = await repository.bulk_update_books(changes, chunk_size, **bulk_selection(body))
+    await invalidate_books(matched)  # Dropping cached copies of every book the change touched
+    return {"matched": len(matched), "updated": updated, "missing": missing}
+
+
+@app.delete("/books/bulk")  # Route to handle DELETE requests for removing many books at once
+async def delete_books_bulk(
+    body: BulkSelection,
+    chunk_size: int = Query(config.BULK_WRITE_CHUNK_SIZE, ge=1, le=config.BULK_WRITE_MAX_CHUNK_SIZE),  # Books per DELETE and commit
+):  # Function to delete a list of ids or every book matching a filter
+    deleted, missing = await repository.bulk_delete_books(chunk_size, **bulk_selection(body))
+    await invalidate_books(deleted)  # Dropping cached copies so deleted books stop being served
+    return {"deleted": len(deleted), "missing": missing}
+
+
+async def stream_books(after_id, limit, fields):
+    """Yield books as NDJSON lines, pulling rows from storage in batches as the client reads."""
+    batches = repository.stream_books(after_id, limit, fields, config.BOOKS_STREAM_BATCH_SIZE)
+    try:
+        async for columns, rows in batches:
+            yield encode_ndjson(columns, rows)  # Encoding straight from the row tuples
+    finally:
+        await batches.aclose()  # Closing now, not at garbage collection, so a client that leaves frees the connection
+
+
+async def get_books_by_ids(book_ids, fields):
+    """Look up a batch of books: cache hits first, then one IN query for the rest."""
+    entries = await run_cache(book_cache.get_many, book_ids) if cache_readable() else {}  # Sharing the cache with GET /books/{book_id}
+    misses = [book_id for book_id in book_ids if book_id not in entries]
+    if misses:
+        generation = book_cache.generation  # Taken before the read so a concurrent update can veto caching stale rows
+        records = await repository.get_books(misses, fields)  # Fetching every miss with a single query
+        for book_id, (book, version, updated_at) in records.items():
+            entry = entries[book_id] = {"book": book, "version": version, "last_modified": conditional.http_date(updated_at)}
+            if fields == crud.BOOK_FIELDS and cache_fillable(book_id):  # Only whole, current books are cached, as in get_book
+                await run_cache(book_cache.set, book_id, entry, generation)
+
+    books = []
+    for book_id in book_ids:  # Answering in the order the ids were requested
+        if book_id in entries:
+            book = entries[book_id]["book"]
+            books.append(book if tuple(book) == fields else {name: book[name] for name in fields})
+    missing = [book_id for book_id in book_ids if book_id not in entries]
+    return json_response({"books": books, "missing": missing})
+
 
 @app.get("/books/")  # Route to handle GET requests for retrieving all books
-async def get_all_books():  # Function to fetch all books from the database
-    connection = create_connection()  # Establishing a connection to the database
-    if not connection:  # Checking if the connection was successful
-        raise HTTPException(status_code=500, detail="Database connection failed")  # Raising an error if connection failed
-    
-    cursor = connection.cursor()  # Creating a cursor object to execute SQL queries
-    query = "SELECT * FROM books"  # SQL query to select all records from the 'books' table
-    cursor.execute(query)  # Executing the query to fetch all books
-    result = cursor.fetchall()  # Fetching all the results from the query
-    
-    books = []  # List to store book data in dictionary format
-    for row in result:  # Iterating through each row in the result
-        books.append({
-            "id": row[0],  # Mapping the 'id' from the database result
-            "title": row[1],  # Mapping the 'title' from the database result
-            "author": row[2],  # Mapping the 'author' from the database result
-            "genre": row[3],  # Mapping the 'genre' from the database result
-            "year_published": row[4],  # Mapping the 'year_published' from the database result
-            "isbn": row[5]  # Mapping the 'isbn' from the database result
-        })
-    
-    cursor.close()  # Closing the cursor
-    connection.close()  # Closing the database connection
-    
-    return {"books": books}  # Returning the list of all books
+@app.get("/books", include_in_schema=False)  # Served directly rather than redirected, so GET /books?ids= is one round trip
+async def get_all_books(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=config.BOOKS_MAX_PAGE_SIZE),  # Page size; defaults to BOOKS_PAGE_SIZE
+    cursor: Optional[str] = None,  # Opaque next_cursor token from the previous page
+    format: Literal["json", "ndjson"] = "json",  # "ndjson" streams the books one per line
+    fields: Optional[str] = None,  # Comma-separated columns to return; id is always included
+    ids: Optional[str] = None,  # Comma-separated ids to fetch in one call instead of a page
+):  # Function to fetch a page of books from the database
+    fields = parse_fields(fields, required=("id",))  # The id also builds next_cursor
+    if ids is not None:  # Batch lookup mode
+        if cursor is not None or format != "json":
+            raise HTTPException(status_code=400, detail="ids cannot be combined with cursor or format")
+        return await get_books_by_ids(parse_ids(ids), fields)
+    try:
+        after_id = decode_cursor(cursor)  # Turning the opaque token back into the last id already seen
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":  # Streaming mode reads every remaining book unless a limit is given; no ETag, so the first row goes out at once
+        return StreamingResponse(stream_books(after_id, limit, fields), media_type="application/x-ndjson")
+
+    limit = limit or config.BOOKS_PAGE_SIZE
+    columns, rows, has_more, page_version = await repository.list_books(after_id, limit, fields)  # Fetching one page from storage
+    etag = conditional.collection_etag(page_version, fields, format, after_id, limit)  # From the rows just read, so it names this body
+    # No Last-Modified: a delete changes the page without making any of its rows newer
+    current = conditional.not_modified_etag(request, etag, None)
+    if current is not None:  # Nothing changed since the client's copy; skip building and sending the body
+        return conditional.not_modified(current, None)
+
+    headers = conditional.validators(etag, None)
+    next_cursor = encode_cursor(rows[-1][columns.index("id")]) if has_more else None  # Token for the following page, if any
+    return json_response({"books": rows_to_books(columns, rows), "next_cursor": next_cursor}, headers)  # Returning the page of books
+
+
+@app.get("/books/search")  # Route to handle GET requests for searching books
+async def search_books(
+    q: Optional[str] = Query(None, min_length=1),  # Full-text terms matched against title and author
+    title: Optional[str] = Query(None, min_length=1),  # Full-text terms matched against the title only
+    author: Optional[str] = Query(None, min_length=1),  # Full-text terms matched against the author only
+    genre: Optional[str] = None,  # Exact genre
+    isbn: Optional[str] = None,  # Exact ISBN
+    year_from: Optional[int] = None,  # Earliest year_published, inclusive
+    year_to: Optional[int] = None,  # Latest year_published, inclusive
+    limit: int = Query(config.BOOKS_PAGE_SIZE, ge=1, le=config.BOOKS_MAX_PAGE_SIZE),  # Page size
+    offset: int = Query(0, ge=0),  # Matches to skip, for paging through ranked results
+):  # Function to search books using the indexes on the books table
+    if all(value is None for value in (q, title, author, genre, isbn, year_from, year_to)):  # Would be an unindexed OFFSET walk of the whole table
+        raise HTTPException(status_code=400, detail="Give at least one search filter; use GET /books/ to list every book")
+    try:
+        books = await repository.search_books(limit, offset, q=q, title=title, author=author,
+                                              genre=genre, isbn=isbn, year_from=year_from, year_to=year_to)  # Running the search in storage
+    except UnsupportedSearchError as e:  # Full-text terms on an engine without FULLTEXT indexes
+        raise HTTPException(status_code=501, detail=str(e))
+    return json_response({"books": books, "limit": limit, "offset": offset})  # Returning the page of matches
+
+
+@app.get("/books/by-isbn/{isbn}")  # Route to handle GET requests for retrieving a book by its ISBN
+async def get_book_by_isbn(isbn: str):  # Function to fetch a single book by its ISBN
+    book = await repository.get_book_by_isbn(isbn)  # Looking up the book through the unique isbn index
+
+    if book:  # If a result is found, return the book data
+        return json_response(book)
+    raise HTTPException(status_code=404, detail="Book not found")  # Raising an HTTP 404 error indicating that the book does not exist
+
+
+@app.get("/metrics", response_class=PlainTextResponse)  # Route exposing request and database metrics to Prometheus
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")  # Route exposing the book cache counters for monitoring
+async def get_cache_stats():
+    return book_cache.stats()
+
+
+def require_admin(request):
+    """Reject the request unless it carries ``Authorization: Bearer <ADMIN_TOKEN>``; without a token the admin routes are off."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+
+def group_commit_batcher():
+    """This worker's group commit batcher, or a 501 when the storage engine has none."""
+    if repository.batcher is None:
+        raise HTTPException(status_code=501, detail="Group commit is not supported by this storage engine")
+    return repository.batcher
+
+
+@app.get("/admin/group-commit")  # Route exposing the group commit settings and batch counters of the worker that answers
+async def get_group_commit(request: Request):
+    require_admin(request)
+    return {**group_commit_batcher().stats(), "worker": os.getpid()}
+
+
+@app.put("/admin/group-commit")  # Route switching or tuning group commit without a restart, in the worker that answers only
+async def update_group_commit(settings: GroupCommitSettings, request: Request):
+    require_admin(request)
+    batcher = group_commit_batcher()
+    await batcher.configure(**settings.model_dump())
+    return {**batcher.stats(), "worker": os.getpid()}
 
 
 @app.get("/books/{book_id}")  # Route to handle GET requests for retrieving a book by its ID
-async def get_book(book_id: int):  # Function to fetch a single book by its ID
-    connection = create_connection()  # Establishing a connection to the database
-    if not connection:  # Checking if the connection was successful
-        raise HTTPException(status_code=500, detail="Database connection failed")  # Raising an error if connection failed
-    
-    cursor = connection.cursor()  # Creating a cursor object to execute SQL queries
-    query = "SELECT * FROM books WHERE id = %s"  # SQL query to select a book by its ID
-    cursor.execute(query, (book_id,))  # Executing the query with the provided book_id
-    result = cursor.fetchone()  # Fetching the first result
-    
-    if result:  # If a result is found, return the book data
-        return {"id": result[0], "title": result[1], "author": result[2], "genre": result[3], "year_published": result[4], "isbn": result[5]}
-    else:  # If no result is found
-        raise HTTPException(status_code=404, detail="Book not found")  # Raising an HTTP 404 error indicating that the book does not exist
+async def get_book(book_id: int, request: Request, fields: Optional[str] = None):  # Function to fetch a single book by its ID
+    fields = parse_fields(fields)  # Columns to return; every column by default
+    entry = await run_cache(book_cache.get, book_id) if cache_readable() else None  # Serving popular books from the cache, which holds whole books and their validators
+    if entry is None:
+        generation = book_cache.generation  # Taken before the read so a concurrent update can veto caching a stale row
+        record = await repository.get_book(book_id, fields)  # Only cache misses reach storage, reading only the requested columns
+
+        if record is None:  # If no result is found
+            raise HTTPException(status_code=404, detail="Book not found")  # Raising an HTTP 404 error indicating that the book does not exist
+        book, version, updated_at = record
+        entry = {"book": book, "version": version, "last_modified": conditional.http_date(updated_at)}
+        if fields == crud.BOOK_FIELDS and cache_fillable(book_id):  # Partial rows are not cached, so every cache entry can serve any projection
+            await run_cache(book_cache.set, book_id, entry, generation)
+
+    etag = conditional.book_etag(book_id, entry["version"], fields)
+    current = conditional.not_modified_etag(request, etag, entry["last_modified"])
+    if current is not None:  # The client's copy is current; no body is built
+        return conditional.not_modified(current, entry["last_modified"])
+
+    book = entry["book"]
+    if tuple(book) != fields:  # Projecting a whole cached book
+        book = {name: book[name] for name in fields}
+    return json_response(book, conditional.validators(etag, entry["last_modified"]))
 
 
 @app.put("/books/{book_id}")  # Route to handle PUT requests for updating a book
-async def update_book(book_id: int, book: BookUpdate):  # Function to update a book using the BookUpdate model for validation
-    connection = create_connection()  # Establishing a connection to the database
-    if not connection:  # Checking if the connection was successful
-        raise HTTPException(status_code=500, detail="Database connection failed")  # Raising an error if connection failed
-    
-    cursor = connection.cursor()  # Creating a cursor object to execute SQL queries
-    query = """UPDATE books SET title = %s, author = %s, genre = %s, 
-               year_published = %s, isbn = %s WHERE id = %s"""  # SQL query to update the book with the new data
-    cursor.execute(query, (book.title, book.author, book.genre, book.year_published, book.isbn, book_id))  # Executing the update query
-    connection.commit()  # Committing the transaction to save the changes
-    
-    if cursor.rowcount == 0:  # If no rows were updated, the book does not exist
+@app.patch("/books/{book_id}")  # PATCH is served by the same partial-update logic
+async def update_book(book_id: int, book: BookUpdate, request: Request):  # Function to update a book using the BookUpdate model for validation
+    changes = book.model_dump(exclude_unset=True, exclude_none=True)  # Only the fields the client actually sent
+    versions = conditional.if_match_versions(request, book_id)  # Row versions the client's If-Match allows, None without one
+    try:
+        found, changed = await repository.update_book(book_id, changes, versions)  # Running the update through the storage engine
+    except DuplicateBookError:  # The unique isbn index rejected the new ISBN
+        raise HTTPException(status_code=409, detail="A book with this ISBN already exists")
+    except VersionConflictError:  # Someone else changed the book since the client read it
+        raise HTTPException(status_code=412, detail="Book has been modified since it was read")
+
+    if not found:  # The book does not exist
         raise HTTPException(status_code=404, detail="Book not found")  # Raising an HTTP 404 error indicating the book was not found
-    
-    cursor.close()  # Closing the cursor
-    connection.close()  # Closing the database connection
+    if not changed:  # Every provided value matched the stored book, so nothing was written
+        return {"message": "Book already up to date"}
+
+    await invalidate_books([book_id])  # Dropping the cached copy so the next read sees the change
     return {"message": "Book updated successfully"}  # Returning a success message
 
 
 @app.delete("/books/{book_id}")  # Route to handle DELETE requests for deleting a book by its ID
 async def delete_book(book_id: int):  # Function to delete a book by its ID
-    connection = create_connection()  # Establishing a connection to the database
-    if not connection:  # Checking if the connection was successful
-        raise HTTPException(status_code=500, detail="Database connection failed")  # Raising an error if connection failed
-    
-    cursor = connection.cursor()  # Creating a cursor object to execute SQL queries
-    query = "DELETE FROM books WHERE id = %s"  # SQL query to delete a book by its ID
-    cursor.execute(query, (book_id,))  # Executing the delete query
-    connection.commit()  # Committing the transaction to delete the book
-    
-    if cursor.rowcount == 0:  # If no rows were deleted, the book does not exist
+    rowcount = await repository.delete_book(book_id)  # Running the delete through the storage engine
+    await invalidate_books([book_id])  # Dropping the cached copy so the book stops being served
+
+    if rowcount == 0:  # If no rows were deleted, the book does not exist
         raise HTTPException(status_code=404, detail="Book not found")  # Raising an HTTP 404 error indicating the book was not found
-    
-    cursor.close()  # Closing the cursor
-    connection.close()  # Closing the database connection
+
     return {"message": "Book deleted successfully"}  # Returning a success message
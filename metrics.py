@@ -0,0 +1,196 @@
+"""Request and database timings, exported in Prometheus text format and as Server-Timing headers."""
+import threading
+import time
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label set."""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labels + ("le",), label_values + (repr(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labels + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "books_http_request_duration_seconds", "Time from receiving a request to sending its response headers.",
+    ("method", "route", "status"))
+db_acquire_duration = Histogram(
+    "books_db_connection_acquire_seconds", "Time spent checking a connection out of the pool.")
+db_query_duration = Histogram(
+    "books_db_query_duration_seconds", "Time spent in cursor.execute per SQL statement.", ("statement",))
+db_fetch_duration = Histogram(
+    "books_db_fetch_duration_seconds", "Time spent fetching result rows per SQL statement.", ("statement",))
+db_rows_returned = Counter(
+    "books_db_rows_returned_total", "Rows fetched from MySQL per SQL statement.", ("statement",))
+db_prepared_statements = Counter(
+    "books_db_prepared_statements_total", "Prepared statement cache lookups by result (hit, miss, eviction).", ("result",))
+db_reads_routed = Counter(
+    "books_db_reads_total", "Repository reads by the server that ran them and why it was chosen.", ("server", "reason"))
+
+REGISTRY = [http_request_duration, db_acquire_duration, db_query_duration, db_fetch_duration, db_rows_returned,
+            db_prepared_statements, db_reads_routed]
+_collectors = []  # Callables returning extra exposition lines, e.g. pool gauges
+
+
+def register_collector(collector):
+    """Add a callable that returns extra Prometheus lines at scrape time."""
+    _collectors.append(collector)
+
+
+def render():
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Database time accumulated while serving one request."""
+
+    __slots__ = ("started", "acquire", "query", "fetch", "queries", "rows")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.acquire = 0.0
+        self.query = 0.0
+        self.fetch = 0.0
+        self.queries = 0
+        self.rows = 0
+
+    def server_timing(self):
+        """Format the timings as a Server-Timing header value (milliseconds)."""
+        total = time.perf_counter() - self.started
+        app = max(0.0, total - self.acquire - self.query - self.fetch)
+        return (f'db-acquire;dur={self.acquire * 1000:.2f}, '
+                f'db-query;dur={self.query * 1000:.2f};desc="{self.queries} queries", '
+                f'db-fetch;dur={self.fetch * 1000:.2f};desc="{self.rows} rows", '
+                f'app;dur={app * 1000:.2f}, total;dur={total * 1000:.2f}')
+
+
+current_timings = ContextVar("current_timings", default=None)  # RequestTimings of the request being served
+
+
+def record_acquire(seconds):
+    """Record a pool checkout."""
+    db_acquire_duration.observe(seconds)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.acquire += seconds
+
+
+def record_query(statement, seconds):
+    """Record one cursor.execute/executemany call."""
+    db_query_duration.observe(seconds, statement)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.query += seconds
+        timings.queries += 1
+
+
+def record_fetch(statement, seconds, rows):
+    """Record one fetchone/fetchmany/fetchall call."""
+    db_fetch_duration.observe(seconds, statement)
+    if rows:
+        db_rows_returned.inc(statement, amount=rows)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.fetch += seconds
+        timings.rows += rows
+
+
+class TimingMiddleware:
+    """ASGI middleware that times each request per route and adds a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                http_request_duration.observe(time.perf_counter() - timings.started, scope["method"],
+                                              route.path if route is not None else "unmatched", message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
@@ -0,0 +1,241 @@
+"""Versioned schema migrations for the books database.
+
+Applies the SQL files in migrations/ in order and records each one in the
+schema_migrations table, so running it again only applies what is new. A
+MySQL named lock keeps several API workers starting at once from applying
+the same migration twice. ``verify_schema`` checks the resulting books table
+against models.Book and the indexes the queries in crud.py rely on.
+
+Examples:
+    python migrate.py status
+    python migrate.py apply
+    python migrate.py verify
+    python migrate.py baseline 004   # Mark 001-004 as applied on a database built by hand
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import typing
+
+from mysql.connector import Error
+
+import database
+from models import Book
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+LOCK_NAME = "books_schema_migrations"  # MySQL GET_LOCK name serializing concurrent runs
+LOCK_TIMEOUT = 60  # Seconds to wait for another process to finish migrating
+
+CREATE_MIGRATIONS_TABLE = """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(16) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (version)
+) ENGINE=InnoDB"""
+
+# Leftmost index columns the queries need, so each lookup or filter has an index to use
+EXPECTED_INDEXES = {
+    "isbn": True,  # Unique: one book per ISBN, and GET /books/by-isbn
+    "author": False,
+    "genre": False,
+    "year_published": False,
+}
+COLUMN_TYPES = {str: ("varchar", "char", "text"), int: ("int", "bigint", "smallint", "mediumint", "tinyint")}
+
+_MIGRATION_FILE = re.compile(r"^(\d+)_(.+)\.sql$")
+
+
+class MigrationError(Exception):
+    """Raised when migrations cannot be applied or no longer match what was applied."""
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding="utf-8") as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def statements(self):
+        """Split the file into statements on semicolons that end a line, dropping comments."""
+        lines = [line for line in self.sql.splitlines() if not line.lstrip().startswith("--")]
+        return [statement.strip() for statement in re.split(r";\s*$", "\n".join(lines), flags=re.MULTILINE)
+                if statement.strip()]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return the migrations in ``directory`` ordered by their numeric prefix."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    migrations.sort(key=lambda migration: int(migration.version))
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def applied_migrations(connection):
+    """Return ``{version: checksum}`` of the migrations recorded in schema_migrations."""
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        cursor.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cursor.fetchall())
+
+
+def pending_migrations(connection, migrations):
+    """Return the migrations not applied yet, failing if an applied file was edited since."""
+    applied = applied_migrations(connection)
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            raise MigrationError(f"Migration {migration.version}_{migration.name} changed after it was applied")
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+def record(cursor, migration):
+    cursor.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                   (migration.version, migration.name, migration.checksum))
+
+
+def migrate(connection, migrations=None):
+    """Apply every pending migration in order and return the ones applied.
+
+    MySQL commits DDL implicitly, so a migration that fails halfway is not
+    recorded and has to be fixed up by hand before running again.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchall()[0][0] != 1:
+            raise MigrationError(f"Timed out waiting for the {LOCK_NAME} lock")
+        try:
+            applied = []
+            for migration in pending_migrations(connection, migrations):  # Read under the lock, so another run's work is seen
+                for statement in migration.statements():
+                    cursor.execute(statement)
+                record(cursor, migration)
+                connection.commit()
+                applied.append(migration)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+
+
+def baseline(connection, version, migrations=None):
+    """Record every migration up to ``version`` as applied without running it."""
+    migrations = load_migrations() if migrations is None else migrations
+    marked = []
+    with connection.cursor() as cursor:
+        for migration in pending_migrations(connection, migrations):
+            if int(migration.version) <= int(version):
+                record(cursor, migration)
+                marked.append(migration)
+        connection.commit()
+    return marked
+
+
+def _field_type(annotation):
+    """The plain Python type behind an annotation such as Annotated[str, ...]."""
+    while typing.get_origin(annotation) is not None:
+        annotation = typing.get_args(annotation)[0]
+    return annotation
+
+
+def verify_schema(connection):
+    """Compare the books table with models.Book and EXPECTED_INDEXES and return a list of problems."""
+    problems = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT column_name, data_type, is_nullable FROM information_schema.columns "
+                       "WHERE table_schema = DATABASE() AND table_name = 'books'")
+        columns = {name.lower(): (data_type.lower(), nullable) for name, data_type, nullable in cursor.fetchall()}
+        cursor.execute("SELECT index_name, non_unique, column_name FROM information_schema.statistics "
+                       "WHERE table_schema = DATABASE() AND table_name = 'books' AND seq_in_index = 1 "
+                       "AND index_type = 'BTREE'")  # FULLTEXT indexes cannot serve equality or range filters
+        leading = {}  # Column -> whether some index starting with it is unique
+        for _, non_unique, column in cursor.fetchall():
+            leading[column.lower()] = leading.get(column.lower(), False) or not int(non_unique)
+
+    if not columns:
+        return ["Table books does not exist"]
+    if "id" not in columns:
+        problems.append("books.id is missing")
+    for name, field in Book.model_fields.items():
+        if name not in columns:
+            problems.append(f"books.{name} is missing")
+            continue
+        data_type, nullable = columns[name]
+        expected = COLUMN_TYPES.get(_field_type(field.annotation), ())
+        if expected and data_type not in expected:
+            problems.append(f"books.{name} is {data_type}, expected one of {', '.join(expected)}")
+        if field.is_required() and nullable == "YES":
+            problems.append(f"books.{name} allows NULL but Book requires it")
+    for column, unique in EXPECTED_INDEXES.items():
+        if column not in leading:
+            problems.append(f"No index starts with books.{column}")
+        elif unique and not leading[column]:
+            problems.append(f"The index on books.{column} is not unique")
+    return problems
+
+
+def migrate_on_startup(pool):
+    """Apply pending migrations through ``pool`` and report schema problems; used when DB_MIGRATE_ON_STARTUP is set."""
+    with pool.connection() as connection:
+        for migration in migrate(connection):
+            print(f"Applied migration {migration.version}_{migration.name}")
+        for problem in verify_schema(connection):
+            print(f"Schema problem: {problem}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__.split("\n\n", 2)[2])
+    parser.add_argument("command", choices=("status", "apply", "verify", "baseline"))
+    parser.add_argument("version", nargs="?", help="last migration to mark as applied (baseline only)")
+    args = parser.parse_args()
+    if args.command == "baseline" and not args.version:
+        parser.error("baseline needs the version of the last migration already in the database")
+
+    try:
+        with database.pool.connection() as connection:
+            run_command(args, connection)
+    except (Error, database.PoolTimeoutError, MigrationError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+def run_command(args, connection):
+    """Carry out one CLI command on ``connection``."""
+    migrations = load_migrations()
+    if args.command == "status":
+        pending = {migration.version for migration in pending_migrations(connection, migrations)}
+        for migration in migrations:
+            print(f"{migration.version}_{migration.name}: {'pending' if migration.version in pending else 'applied'}")
+    elif args.command == "apply":
+        applied = migrate(connection, migrations)
+        for migration in applied:
+            print(f"Applied {migration.version}_{migration.name}")
+        if not applied:
+            print("Schema is up to date")
+    elif args.command == "baseline":
+        for migration in baseline(connection, args.version, migrations):
+            print(f"Marked {migration.version}_{migration.name} as applied")
+
+    if args.command in ("apply", "verify"):
+        problems = verify_schema(connection)
+        for problem in problems:
+            print(f"Schema problem: {problem}")
+        if problems:
+            sys.exit(1)
+        print("Schema matches models.Book")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+-- Indexes behind GET /books/search.
+-- B-tree indexes serve the exact-match and range filters; FULLTEXT indexes
+-- serve the relevance-ranked text filters, which LIKE '%term%' cannot do.
+CREATE INDEX idx_books_isbn ON books (isbn);
+CREATE INDEX idx_books_genre_year ON books (genre, year_published);
+CREATE INDEX idx_books_year ON books (year_published);
+CREATE FULLTEXT INDEX ft_books_title_author ON books (title, author);
+CREATE FULLTEXT INDEX ft_books_title ON books (title);
+CREATE FULLTEXT INDEX ft_books_author ON books (author);
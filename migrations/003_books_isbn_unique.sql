@@ -0,0 +1,2 @@
+-- Enforce one book per ISBN and serve GET /books/by-isbn/{isbn} from the unique index.
+ALTER TABLE books DROP INDEX idx_books_isbn, ADD UNIQUE INDEX uq_books_isbn (isbn);
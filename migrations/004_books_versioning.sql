@@ -0,0 +1,6 @@
+-- Validators behind the ETag and Last-Modified headers.
+-- books.version is bumped by every UPDATE the API makes; listing ETags are
+-- summarised from the version and updated_at of the rows on the page.
+ALTER TABLE books
+    ADD COLUMN version INT UNSIGNED NOT NULL DEFAULT 1,
+    ADD COLUMN updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
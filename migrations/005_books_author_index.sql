@@ -0,0 +1,3 @@
+-- B-tree index on author for exact author filters, e.g. PATCH/DELETE /books/bulk
+-- with {"filter": {"author": ...}}. The FULLTEXT indexes cannot serve equality.
+CREATE INDEX idx_books_author ON books (author);
@@ -1,7 +1,11 @@
-import re
-from typing import Optional
+from typing import Annotated, List, Optional
 
-from pydantic import BaseModel, field_validator, model_validator
+from pydantic import BaseModel, Field, StringConstraints, model_validator
+
+ISBN_PATTERN = r"^\d{3}-\d{10}$"  # ISBN format, e.g. 123-1234567890
+
+# The pattern is enforced by pydantic-core itself, so ISBN checks never call back into Python
+ISBN = Annotated[str, StringConstraints(pattern=ISBN_PATTERN)]
 
 
 class Book(BaseModel):
@@ -10,14 +14,7 @@ class Book(BaseModel):
     author: str
     genre: str
     year_published: int
-    isbn: str
-
-    @field_validator("isbn")
-    def check_isbn(cls, value):
-        # Validate the ISBN format
-        if not re.match(r"^\d{3}-\d{10}$", value):
-            raise ValueError("Invalid ISBN format. Example: 123-1234567890")
-        return value
+    isbn: ISBN
 
 
 class BookUpdate(BaseModel):
@@ -26,18 +23,59 @@ class BookUpdate(BaseModel):
     author: Optional[str] = None
     genre: Optional[str] = None
     year_published: Optional[int] = None
-    isbn: Optional[str] = None
+    isbn: Optional[ISBN] = None
 
-    @model_validator(mode='before')
-    def check_at_least_one_field(cls, values):
+    @model_validator(mode='after')
+    def check_at_least_one_field(self):
         # Validate that at least one field is provided for update
-        if not any(value is not None for value in values.values()):
+        if not any(getattr(self, field) is not None for field in self.model_fields_set):
             raise ValueError("At least one field must be provided for update.")
-        return values
-
-    @field_validator("isbn", mode="before")
-    def check_isbn_update(cls, value):
-        # Validate the ISBN format for update
-        if value and not re.match(r"^\d{3}-\d{10}$", value):
-            raise ValueError("Invalid ISBN format. Example: 123-1234567890")
-        return value
+        return self
+
+
+class BookFilter(BaseModel):
+    # Exact-match conditions selecting the books a bulk change applies to
+    genre: Optional[str] = None
+    author: Optional[str] = None
+    isbn: Optional[ISBN] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+    @model_validator(mode='after')
+    def check_at_least_one_condition(self):
+        # An empty filter would match the whole table
+        if all(getattr(self, field) is None for field in self.model_fields):
+            raise ValueError("A filter needs at least one condition.")
+        return self
+
+
+class BulkSelection(BaseModel):
+    # The books a bulk change applies to: explicit ids or a filter
+    ids: Optional[List[int]] = None
+    filter: Optional[BookFilter] = None
+
+    @model_validator(mode='after')
+    def check_exactly_one_selection(self):
+        # Validate that the books are chosen one way only
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Provide either ids or filter.")
+        return self
+
+
+class BulkUpdate(BulkSelection):
+    # Changes applied to every selected book
+    changes: BookUpdate
+
+    @model_validator(mode='after')
+    def check_no_unique_fields(self):
+        # ISBNs are unique, so one value cannot be written to several books
+        if self.changes.isbn is not None:
+            raise ValueError("isbn cannot be changed in bulk.")
+        return self
+
+
+class GroupCommitSettings(BaseModel):
+    # Runtime changes to batching.GroupCommitBatcher; omitted fields keep their value
+    enabled: Optional[bool] = None
+    window_ms: Optional[float] = Field(None, gt=0, le=1000)
+    max_rows: Optional[int] = Field(None, ge=1, le=10000)
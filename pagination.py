@@ -0,0 +1,26 @@
+import base64
+import json
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(last_id):
+    """Build the opaque token that resumes a listing after ``last_id``."""
+    payload = json.dumps({"after_id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(token):
+    """Return the id a listing should resume after, or 0 when there is no cursor."""
+    if not token:
+        return 0
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded))["after_id"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+    if not isinstance(after_id, int) or after_id < 0:
+        raise InvalidCursorError("Invalid pagination cursor")
+    return after_id
@@ -0,0 +1,238 @@
+"""Routing reads to MySQL read replicas.
+
+Each host in DB_REPLICA_HOSTS gets its own ConnectionPool. storage.MySQLRepository
+sends reads through ``router.checkout`` and writes to the primary pool. A read
+stays on the primary when:
+
+- the client wrote within READ_YOUR_WRITES_WINDOW seconds, so it sees its own
+  change (ReadYourWritesMiddleware carries this between requests in a cookie);
+- every replica is more than DB_REPLICA_MAX_LAG seconds behind;
+- every replica is unreachable. A replica that fails is left out for
+  DB_REPLICA_RETRY_AFTER seconds.
+"""
+import itertools
+import math
+import time
+from contextvars import ContextVar
+
+from mysql.connector import Error, ProgrammingError
+
+import config
+import database
+import metrics
+from database import ConnectionPool, PoolTimeoutError
+
+SELECTIONS = ("round_robin", "least_loaded")
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")  # Requests that cannot write, so they do not open a read-your-writes window
+
+read_from_primary = ContextVar("read_from_primary", default=False)  # Set for requests that must see the latest writes
+
+
+def parse_hosts(text):
+    """Turn ``"db-r1, db-r2:3307"`` into ``[("db-r1", 3306), ("db-r2", 3307)]``."""
+    hosts = []
+    for part in text.split(","):
+        host, _, port = part.strip().partition(":")
+        if host:
+            hosts.append((host, int(port) if port else config.DB_PORT))
+    return hosts
+
+
+def replication_lag(connection):
+    """Return how many seconds the replica behind ``connection`` trails its source.
+
+    0 when the server is not replicating at all, and infinity when replication
+    is configured but stopped.
+    """
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")  # MySQL 8.0.22 and later
+            column = "Seconds_Behind_Source"
+        except ProgrammingError:
+            cursor.execute("SHOW SLAVE STATUS")
+            column = "Seconds_Behind_Master"
+        rows = cursor.fetchall()
+        if not rows:
+            return 0.0
+        lag = dict(zip(cursor.column_names, rows[0]))[column]
+        return math.inf if lag is None else float(lag)
+
+
+class Replica:
+    """One read replica: its connection pool and what the router last learned about it."""
+
+    def __init__(self, host, port, pool):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.lag = None  # Seconds behind the primary at the last check, None before the first one
+        self.checked_at = -math.inf  # time.monotonic() of the last lag check
+        self.down_until = 0.0  # time.monotonic() before which the replica is not tried
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    def check_due(self, now, interval):
+        return now - self.checked_at >= interval
+
+    def usable(self, now, max_lag, interval):
+        """Reachable, and either caught up or due for a lag check that may show it has caught up."""
+        if now < self.down_until:
+            return False
+        return self.lag is None or self.lag <= max_lag or self.check_due(now, interval)
+
+    def mark_down(self, retry_after):
+        self.down_until = time.monotonic() + retry_after
+
+
+class ReplicaRouter:
+    """Picks a replica connection for each read, or none when the read belongs on the primary."""
+
+    def __init__(self, replicas, selection=config.DB_REPLICA_SELECTION, max_lag=config.DB_REPLICA_MAX_LAG,
+                 check_interval=config.DB_REPLICA_CHECK_INTERVAL, retry_after=config.DB_REPLICA_RETRY_AFTER):
+        if selection not in SELECTIONS:
+            raise ValueError(f"Replica selection must be one of: {', '.join(SELECTIONS)}")
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self._turn = itertools.count()
+
+    @property
+    def staleness(self):
+        """Upper bound, in seconds, on how old a replica read can be; 0 without replicas."""
+        return self.max_lag + self.check_interval if self.replicas else 0.0
+
+    def open(self):
+        for replica in self.replicas:
+            replica.pool.open()
+
+    def close(self):
+        for replica in self.replicas:
+            replica.pool.close()
+
+    def candidates(self):
+        """Usable replicas, in the order to try them."""
+        now = time.monotonic()
+        usable = [replica for replica in self.replicas if replica.usable(now, self.max_lag, self.check_interval)]
+        if not usable:
+            return []
+        if self.selection == "least_loaded":
+            return sorted(usable, key=lambda replica: replica.pool.stats()["in_use"] / replica.pool.max_size)
+        start = next(self._turn) % len(usable)
+        return usable[start:] + usable[:start]
+
+    async def checkout(self):
+        """Borrow a connection for a read; return ``(replica, connection)``, or ``(None, None)`` to use the primary."""
+        if read_from_primary.get():
+            metrics.db_reads_routed.inc("primary", "read_your_writes")
+            return None, None
+        for replica in self.candidates():
+            try:
+                connection = await replica.pool.acquire_async()
+            except PoolTimeoutError:  # Busy rather than broken: try the next one
+                continue
+            except Error:
+                replica.mark_down(self.retry_after)
+                continue
+            if replica.check_due(time.monotonic(), self.check_interval):
+                caught_up = False
+                try:
+                    caught_up = await self._check_lag(replica, connection)
+                finally:  # Also on cancellation, so the connection is never lost
+                    if not caught_up:
+                        replica.pool.release_soon(connection)
+                if not caught_up:
+                    continue
+            metrics.db_reads_routed.inc(replica.name, "selected")
+            return replica, connection
+        if self.replicas:
+            metrics.db_reads_routed.inc("primary", "no_replica")
+        return None, None
+
+    async def _check_lag(self, replica, connection):
+        """Refresh ``replica.lag`` and return whether the replica is recent enough to read from."""
+        try:
+            replica.lag = await connection.run(replication_lag)
+        except Error:
+            replica.mark_down(self.retry_after)
+            return False
+        replica.checked_at = time.monotonic()
+        return replica.lag <= self.max_lag
+
+    def stats(self):
+        now = time.monotonic()
+        return [{"replica": replica.name, "up": now >= replica.down_until, "lag": replica.lag, **replica.pool.stats()}
+                for replica in self.replicas]
+
+
+def create_router(hosts=config.DB_REPLICA_HOSTS):
+    """Build the router for the configured replicas, each with its own pool."""
+    replicas = []
+    for host, port in parse_hosts(hosts):
+        pool = ConnectionPool(min_size=config.DB_REPLICA_POOL_MIN_SIZE, max_size=config.DB_REPLICA_POOL_MAX_SIZE,
+                              connect=lambda host=host, port=port: database.create_connection(host, port))
+        replicas.append(Replica(host, port, pool))
+    return ReplicaRouter(replicas)
+
+
+router = create_router()  # Shared router used by storage.MySQLRepository
+
+
+def _replica_metrics():
+    replica_stats = router.stats()
+    lines = ["# HELP books_db_replica_lag_seconds Replication lag seen at the last check.",
+             "# TYPE books_db_replica_lag_seconds gauge"]
+    for stats in replica_stats:
+        if stats["lag"] is not None:
+            lines.append(f'books_db_replica_lag_seconds{{replica="{stats["replica"]}"}} {stats["lag"]}')
+    lines += ["# HELP books_db_replica_up Whether a replica is in rotation (1) or left out after a failure (0).",
+              "# TYPE books_db_replica_up gauge"]
+    lines += [f'books_db_replica_up{{replica="{stats["replica"]}"}} {int(stats["up"])}' for stats in replica_stats]
+    return lines
+
+
+metrics.register_collector(_replica_metrics)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware that keeps a client's reads on the primary for a while after it writes.
+
+    Writes run with ``read_from_primary`` set and, when they succeed, set a
+    cookie that expires after ``window`` seconds. Requests carrying the cookie
+    read from the primary too. Does nothing when no replicas are configured.
+    """
+
+    def __init__(self, app, window=config.READ_YOUR_WRITES_WINDOW, cookie=config.READ_YOUR_WRITES_COOKIE):
+        self.app = app
+        self.window = window
+        self.cookie = cookie
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not router.replicas or self.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        writes = scope["method"] not in SAFE_METHODS
+        token = read_from_primary.set(writes or self.has_cookie(scope))
+
+        async def send_with_cookie(message):
+            if writes and message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{self.cookie}=1; Max-Age={math.ceil(self.window)}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            read_from_primary.reset(token)
+
+    def has_cookie(self, scope):
+        for key, value in scope["headers"]:
+            if key == b"cookie":
+                for part in value.decode("latin-1").split(";"):
+                    if part.strip().partition("=")[0] == self.cookie:
+                        return True
+        return False
@@ -0,0 +1,37 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder when orjson is not installed
+    orjson = None
+
+
+def dumps(content):
+    """Encode ``content`` to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    Returning it from a route bypasses FastAPI's jsonable_encoder pass, which
+    dominates the cost of large book lists, so the content must already be
+    plain JSON types.
+    """
+
+    def render(self, content):
+        return dumps(content)
+
+
+def rows_to_books(columns, rows):
+    """Zip cursor tuples with the cursor's column names into book dictionaries."""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def encode_ndjson(columns, rows):
+    """Encode cursor tuples as newline-delimited JSON bytes, one book per line."""
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
@@ -0,0 +1,60 @@
+"""Structured log of SQL statements that exceed SLOW_QUERY_THRESHOLD_MS."""
+import json
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+
+import config
+
+logger = logging.getLogger("books.slow_query")
+logger.propagate = False  # Slow queries go to their own file, not the application log
+
+
+class JSONLineFormatter(logging.Formatter):
+    """Format each record's ``slow_query`` payload as one JSON object per line."""
+
+    def format(self, record):
+        payload = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                   + f".{int(record.msecs):03d}Z", **record.slow_query}
+        return json.dumps(payload, default=str)
+
+
+def _configure():
+    if logger.handlers:
+        return
+    handler = RotatingFileHandler(config.SLOW_QUERY_LOG_FILE, maxBytes=config.SLOW_QUERY_LOG_MAX_BYTES,
+                                  backupCount=config.SLOW_QUERY_LOG_BACKUPS, encoding="utf-8")
+    handler.setFormatter(JSONLineFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+
+
+def is_slow(seconds):
+    """Whether a statement that took ``seconds`` crosses the slow-query threshold."""
+    return config.SLOW_QUERY_THRESHOLD_MS >= 0 and seconds * 1000 >= config.SLOW_QUERY_THRESHOLD_MS
+
+
+def param_shape(params):
+    """Describe bound parameters by type (and string length) without logging their values."""
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {name: param_shape([value])[0] for name, value in params.items()}
+    shapes = []
+    for value in params:
+        if isinstance(value, (str, bytes)):
+            shapes.append(f"{type(value).__name__}({len(value)})")
+        elif isinstance(value, (list, tuple)):
+            shapes.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            shapes.append(type(value).__name__)
+    return shapes
+
+
+def log_slow_query(statement, params, seconds, rows, plan=None):
+    """Write one slow statement to the rotating slow-query log."""
+    _configure()
+    record = {"statement": statement, "params": param_shape(params), "duration_ms": round(seconds * 1000, 3), "rows": rows}
+    if plan is not None:
+        record["explain"] = plan
+    logger.warning("slow query", extra={"slow_query": record})
@@ -0,0 +1,136 @@
+"""sqlite3 connections shaped like mysql.connector ones, for storage.SQLiteRepository.
+
+It adapts sqlite3 to the small part of the mysql.connector interface that
+crud.py uses: %s placeholders, cursor.column_names, and IntegrityError with
+a MySQL errno for duplicate keys. ``SELECT ... FOR UPDATE`` opens an
+IMMEDIATE transaction, SQLite's nearest equivalent to row locks. A trigger
+stands in for MySQL's ON UPDATE timestamps. Full-text search
+(GET /books/search) is MySQL-only and is not supported.
+"""
+import sqlite3
+
+from mysql.connector import errorcode, errors
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    year_published INTEGER NOT NULL,
+    isbn TEXT NOT NULL UNIQUE,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TRIGGER IF NOT EXISTS books_touch AFTER UPDATE OF version ON books BEGIN
+    UPDATE books SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+END;
+"""
+
+
+INTEGRITY_ERRNOS = (  # sqlite3 message prefix -> the MySQL errno for the same constraint
+    ("UNIQUE constraint failed", errorcode.ER_DUP_ENTRY),
+    ("PRIMARY KEY constraint failed", errorcode.ER_DUP_ENTRY),
+    ("NOT NULL constraint failed", errorcode.ER_BAD_NULL_ERROR),
+    ("CHECK constraint failed", errorcode.ER_CHECK_CONSTRAINT_VIOLATED),
+    ("FOREIGN KEY constraint failed", errorcode.ER_NO_REFERENCED_ROW_2),
+)
+
+
+def _translate_error(error):
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        errno = next((errno for prefix, errno in INTEGRITY_ERRNOS if message.startswith(prefix)), None)
+        return errors.IntegrityError(msg=message, errno=errno)
+    return errors.DatabaseError(msg=message)
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        try:
+            if query.endswith(" FOR UPDATE"):  # SQLite has no row locks: take the database write lock until commit instead
+                query = query[:-len(" FOR UPDATE")]
+                if not self._cursor.connection.in_transaction:
+                    self._cursor.execute("BEGIN IMMEDIATE")
+            self._cursor.execute(query.replace("%s", "?"), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def executemany(self, query, seq_params):
+        seq_params = [tuple(params) for params in seq_params]
+        if len(seq_params) == 1:  # sqlite3 only sets lastrowid after execute(), and mysql.connector sends one row as one INSERT anyway
+            self.execute(query, seq_params[0])
+            return
+        try:
+            self._cursor.executemany(query.replace("%s", "?"), seq_params)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    unread_result = False  # sqlite3 cursors hold no server-side result set
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._open = True
+
+    def cursor(self, **kwargs):
+        return SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def consume_results(self):
+        pass
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def close(self):
+        self._open = False
+        self._connection.close()
+
+
+def create_schema(path):
+    """Create the books schema in the database file at ``path`` if it is not there yet."""
+    connection = sqlite3.connect(path)
+    try:  # sqlite3's context manager only commits; it never closes the connection
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.commit()
+    finally:
+        connection.close()
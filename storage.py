@@ -0,0 +1,440 @@
+"""Storage engines behind the /books/ routes.
+
+main.py talks to a BookRepository and never to a database driver, so the API
+can run on MySQL (production), a SQLite file (CI, load tests, embedded
+read-only replicas) or a process-local array (benchmarking the HTTP layer in
+isolation). BOOKS_STORAGE in config.py picks the engine.
+"""
+from datetime import datetime, timezone
+from functools import partial
+
+from mysql.connector import Error, IntegrityError, InterfaceError, OperationalError
+
+import batching
+import config
+import crud
+import database
+import migrate
+import replicas
+import sqlite_adapter
+from crud import VersionConflictError
+from database import PoolTimeoutError, is_duplicate_key
+
+
+class StorageUnavailableError(Exception):
+    """Raised when the storage engine cannot be reached or has no free connection."""
+
+
+class DuplicateBookError(Exception):
+    """Raised when a write would give two books the same ISBN."""
+
+
+class UnsupportedSearchError(Exception):
+    """Raised when a search uses a filter the storage engine cannot serve, e.g. full-text terms without FULLTEXT indexes."""
+
+
+class BookRepository:
+    """Interface every storage engine implements.
+
+    Books are dictionaries keyed by column name. Reads that feed ETags return
+    ``(book, version, updated_at)``; list reads return ``(columns, rows, ...)``
+    with rows as tuples, so responses can be encoded without building dicts.
+    Engines that support group commit expose a batching.GroupCommitBatcher as
+    ``batcher``; it is None elsewhere.
+    """
+
+    batcher = None
+
+    def open(self):
+        """Prepare the engine when the app starts."""
+
+    def close(self):
+        """Release the engine's resources when the app stops."""
+
+    async def create_book(self, book):
+        """Insert a validated Book and return its id; raise DuplicateBookError on a taken ISBN."""
+        raise NotImplementedError
+
+    async def create_books(self, books):
+        """Insert a batch of Books; return one ``(id, error_message)`` pair per book, the message None on success."""
+        raise NotImplementedError
+
+    async def get_book(self, book_id, fields=crud.BOOK_FIELDS):
+        """Return ``(book, version, updated_at)`` for one book, or None."""
+        raise NotImplementedError
+
+    async def get_books(self, book_ids, fields=crud.BOOK_FIELDS):
+        """Return ``{id: (book, version, updated_at)}`` for the ids that exist."""
+        raise NotImplementedError
+
+    async def get_book_by_isbn(self, isbn):
+        """Return the book with this ISBN, or None."""
+        raise NotImplementedError
+
+    async def list_books(self, after_id, limit, fields=crud.BOOK_FIELDS):
+        """Return ``(columns, rows, has_more, page_version)`` for up to ``limit`` books after ``after_id`` in id order.
+
+        ``page_version`` is crud.summarise_page over the page and the row after it.
+        """
+        raise NotImplementedError
+
+    async def stream_books(self, after_id, limit, fields, batch_size):
+        """Yield ``(columns, rows)`` batches of the books after ``after_id``; every book when ``limit`` is None."""
+        raise NotImplementedError
+
+    async def search_books(self, limit, offset, **filters):
+        """Return one page of books matching ``filters``; engines without full-text search raise UnsupportedSearchError for text terms."""
+        raise NotImplementedError
+
+    async def update_book(self, book_id, changes, versions=None):
+        """Apply ``changes`` and return ``(found, changed)``; raise VersionConflictError or DuplicateBookError."""
+        raise NotImplementedError
+
+    async def delete_book(self, book_id):
+        """Delete a book and return the number of books removed."""
+        raise NotImplementedError
+
+    async def bulk_update_books(self, changes, chunk_size, ids=None, filters=None):
+        """Apply ``changes`` to many books and return ``(matched_ids, updated, missing_ids)``."""
+        raise NotImplementedError
+
+    async def bulk_delete_books(self, chunk_size, ids=None, filters=None):
+        """Delete many books and return ``(deleted_ids, missing_ids)``."""
+        raise NotImplementedError
+
+
+class SQLRepository(BookRepository):
+    """Runs the queries in crud.py on connections from a ConnectionPool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.batcher = batching.GroupCommitBatcher(self._create_batch)
+
+    def open(self):
+        self.pool.open()
+        database.monitored_pool = self.pool  # Reporting this engine's pool on /metrics
+
+    def close(self):
+        self.pool.close()
+        if database.monitored_pool is self.pool:
+            database.monitored_pool = None
+
+    async def _acquire(self):
+        try:
+            return await self.pool.acquire_async()  # Checking out a healthy connection without blocking the event loop
+        except (Error, PoolTimeoutError) as e:  # The database is unreachable or every connection is busy
+            raise StorageUnavailableError("Database connection failed") from e
+
+    async def _run(self, func, *args, **kwargs):
+        """Run one crud function on a borrowed connection and hand the connection back."""
+        connection = await self._acquire()
+        try:
+            return await connection.run(func, *args, **kwargs)
+        finally:
+            self.pool.release_soon(connection)  # Resetting and returning the connection without awaiting, so cancellation cannot skip it
+
+    async def _checkout_read(self):
+        """Borrow a connection for a read and return ``(pool, connection)``; the pool takes it back."""
+        return self.pool, await self._acquire()
+
+    async def _read(self, func, *args, **kwargs):
+        """Run a crud function that only reads; engines with replicas may send it to one."""
+        return await self._run(func, *args, **kwargs)
+
+    async def create_book(self, book):
+        if self.batcher.enabled:  # Sharing one INSERT and COMMIT with concurrent callers
+            return await self.batcher.submit(book)
+        try:
+            return await self._run(crud.create_book, book)
+        except IntegrityError as e:  # The unique isbn index rejected the insert
+            if is_duplicate_key(e):
+                raise DuplicateBookError(book.isbn) from e
+            raise
+
+    async def _create_batch(self, books):
+        """Write a group commit batch; each rejected book gets the exception create_book would raise."""
+        results = []
+        for book, (book_id, error) in zip(books, await self._run(crud.create_books, books)):
+            if isinstance(error, IntegrityError) and is_duplicate_key(error):
+                error = DuplicateBookError(book.isbn)
+            results.append((book_id, error))
+        return results
+
+    async def create_books(self, books):
+        return [(book_id, error.msg if error is not None else None)
+                for book_id, error in await self._run(crud.create_books, books)]
+
+    async def get_book(self, book_id, fields=crud.BOOK_FIELDS):
+        return await self._read(crud.get_versioned_book, book_id, fields)
+
+    async def get_books(self, book_ids, fields=crud.BOOK_FIELDS):
+        return await self._read(crud.get_versioned_books, book_ids, fields)
+
+    async def get_book_by_isbn(self, isbn):
+        return await self._read(crud.get_book_by_isbn, isbn)
+
+    async def list_books(self, after_id, limit, fields=crud.BOOK_FIELDS):
+        return await self._read(crud.list_books, after_id, limit, fields)
+
+    async def stream_books(self, after_id, limit, fields, batch_size):
+        # The stream outlives the request, so it keeps its own connection and hands
+        # it back when the last row is read or the consumer closes the generator.
+        pool, connection = await self._checkout_read()
+        cursor = None
+        try:
+            cursor = await connection.run(crud.open_book_stream, after_id, limit, fields)
+            while True:
+                rows = await connection.run(crud.fetch_batch, cursor, batch_size)  # Pulling the next batch of rows
+                if not rows:  # The result set is exhausted
+                    break
+                yield cursor.column_names, rows
+        finally:
+            pool.release_soon(connection, partial(crud.close_book_stream, cursor=cursor) if cursor is not None else None)
+
+    async def search_books(self, limit, offset, **filters):
+        return await self._read(crud.search_books, limit, offset, **filters)
+
+    async def update_book(self, book_id, changes, versions=None):
+        try:
+            return await self._run(crud.update_book, book_id, changes, versions)
+        except IntegrityError as e:  # The unique isbn index rejected the new ISBN
+            if is_duplicate_key(e):
+                raise DuplicateBookError(changes.get("isbn")) from e
+            raise
+
+    async def delete_book(self, book_id):
+        return await self._run(crud.delete_book, book_id)
+
+    async def bulk_update_books(self, changes, chunk_size, ids=None, filters=None):
+        return await self._run(crud.bulk_update_books, changes, chunk_size, ids=ids, filters=filters)
+
+    async def bulk_delete_books(self, chunk_size, ids=None, filters=None):
+        return await self._run(crud.bulk_delete_books, chunk_size, ids=ids, filters=filters)
+
+
+class MySQLRepository(SQLRepository):
+    """The production engine: writes on database.pool, reads spread over the replicas in replicas.router."""
+
+    def __init__(self, pool=None, router=None):
+        super().__init__(pool if pool is not None else database.pool)
+        self.router = router if router is not None else replicas.router
+
+    def open(self):
+        super().open()
+        if config.DB_MIGRATE_ON_STARTUP:  # Bringing the schema up to date before serving requests
+            migrate.migrate_on_startup(self.pool)
+        self.router.open()
+
+    def close(self):
+        super().close()
+        self.router.close()
+
+    async def _checkout_read(self):
+        replica, connection = await self.router.checkout()
+        if connection is None:  # No replicas, a recent write by this client, or every replica lagging or down
+            return await super()._checkout_read()
+        return replica.pool, connection
+
+    async def _read(self, func, *args, **kwargs):
+        replica, connection = await self.router.checkout()
+        if connection is None:
+            return await self._run(func, *args, **kwargs)
+        try:
+            return await connection.run(func, *args, **kwargs)
+        except (InterfaceError, OperationalError):  # The replica went away mid-query; reads are safe to repeat
+            replica.mark_down(self.router.retry_after)
+        finally:
+            replica.pool.release_soon(connection)
+        return await self._run(func, *args, **kwargs)
+
+
+class SQLiteRepository(SQLRepository):
+    """A SQLite file through sqlite_adapter; everything but full-text search works."""
+
+    def __init__(self, path=config.BOOKS_SQLITE_PATH):
+        self.path = path
+        super().__init__(database.ConnectionPool(connect=lambda: sqlite_adapter.SQLiteConnection(path),
+                                                 statement_cache_size=0))  # sqlite3 caches compiled statements itself
+
+    def open(self):
+        sqlite_adapter.create_schema(self.path)
+        super().open()
+
+    async def search_books(self, limit, offset, **filters):
+        if any(filters.get(name) for name in ("q", "title", "author")):
+            raise UnsupportedSearchError("Full-text search needs the MySQL engine")
+        return await super().search_books(limit, offset, **filters)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class InMemoryRepository(BookRepository):
+    """Process-local engine that keeps every book in a Python list indexed by ``id - 1``.
+
+    Nothing is persisted and each worker has its own copy. It exists to load
+    test the HTTP layer without any database cost, and it never blocks, so
+    its methods run straight on the event loop.
+    """
+
+    _POSITIONS = {name: index for index, name in enumerate(crud.BOOK_FIELDS)}
+    _VERSION = len(crud.BOOK_FIELDS)  # Row layout: the book columns, then version and updated_at
+    _UPDATED_AT = _VERSION + 1
+
+    def __init__(self):
+        self._rows = []  # id - 1 -> [*BOOK_FIELDS, version, updated_at], or None once deleted
+        self._ids_by_isbn = {}
+
+    def _row(self, book_id):
+        if 0 < book_id <= len(self._rows):
+            return self._rows[book_id - 1]
+        return None
+
+    def _project(self, row, fields):
+        return tuple(row[self._POSITIONS[name]] for name in fields)
+
+    def _record(self, row, fields):
+        return dict(zip(fields, self._project(row, fields))), row[self._VERSION], row[self._UPDATED_AT]
+
+    def _insert(self, book):
+        if book.isbn in self._ids_by_isbn:
+            raise DuplicateBookError(book.isbn)
+        book_id = len(self._rows) + 1
+        self._rows.append([book_id, *crud.book_params(book), 1, _now()])
+        self._ids_by_isbn[book.isbn] = book_id
+        return book_id
+
+    async def create_book(self, book):
+        return self._insert(book)
+
+    async def create_books(self, books):
+        results = []
+        for book in books:
+            try:
+                results.append((self._insert(book), None))
+            except DuplicateBookError:
+                results.append((None, f"Duplicate entry '{book.isbn}' for key 'books.uq_books_isbn'"))
+        return results
+
+    async def get_book(self, book_id, fields=crud.BOOK_FIELDS):
+        row = self._row(book_id)
+        return self._record(row, fields) if row is not None else None
+
+    async def get_books(self, book_ids, fields=crud.BOOK_FIELDS):
+        return {book_id: self._record(row, fields) for book_id, row in ((i, self._row(i)) for i in book_ids) if row is not None}
+
+    async def get_book_by_isbn(self, isbn):
+        book_id = self._ids_by_isbn.get(isbn)
+        return self._record(self._rows[book_id - 1], crud.BOOK_FIELDS)[0] if book_id is not None else None
+
+    def _scan(self, after_id, count):
+        """Collect up to ``count`` stored rows after ``after_id``."""
+        rows = []
+        for index in range(max(after_id, 0), len(self._rows)):  # Ids are list positions, so the scan jumps straight past the cursor
+            row = self._rows[index]
+            if row is None:
+                continue
+            if len(rows) == count:
+                break
+            rows.append(row)
+        return rows
+
+    async def list_books(self, after_id, limit, fields=crud.BOOK_FIELDS):
+        rows = self._scan(after_id, limit + 1)  # One extra row tells whether another page exists
+        page_version = crud.summarise_page((row[0], row[self._VERSION], row[self._UPDATED_AT]) for row in rows)
+        return fields, [self._project(row, fields) for row in rows[:limit]], len(rows) > limit, page_version
+
+    async def stream_books(self, after_id, limit, fields, batch_size):
+        sent = 0
+        while limit is None or sent < limit:
+            size = batch_size if limit is None else min(batch_size, limit - sent)
+            rows = [self._project(row, fields) for row in self._scan(after_id, size)]
+            if not rows:
+                break
+            yield fields, rows
+            sent += len(rows)
+            after_id = rows[-1][fields.index("id")]  # Listings always include the id
+
+    def _matches(self, row, genre=None, author=None, isbn=None, year_from=None, year_to=None):
+        positions = self._POSITIONS
+        return ((genre is None or row[positions["genre"]] == genre)
+                and (author is None or row[positions["author"]] == author)
+                and (isbn is None or row[positions["isbn"]] == isbn)
+                and (year_from is None or row[positions["year_published"]] >= year_from)
+                and (year_to is None or row[positions["year_published"]] <= year_to))
+
+    async def search_books(self, limit, offset, q=None, title=None, author=None, **filters):
+        if q or title or author:
+            raise UnsupportedSearchError("Full-text search needs the MySQL engine")
+        matches = [row for row in self._rows if row is not None and self._matches(row, **filters)]
+        return [self._record(row, crud.BOOK_FIELDS)[0] for row in matches[offset:offset + limit]]
+
+    def _apply(self, row, changes):
+        """Write ``changes`` into ``row`` and return whether any value differed."""
+        changes = {column: value for column, value in changes.items()
+                   if column in crud.BOOK_COLUMNS and row[self._POSITIONS[column]] != value}
+        if not changes:
+            return False
+        isbn = changes.get("isbn")
+        if isbn is not None:
+            if isbn in self._ids_by_isbn:
+                raise DuplicateBookError(isbn)
+            del self._ids_by_isbn[row[self._POSITIONS["isbn"]]]
+            self._ids_by_isbn[isbn] = row[0]
+        for column, value in changes.items():
+            row[self._POSITIONS[column]] = value
+        row[self._VERSION] += 1
+        row[self._UPDATED_AT] = _now()
+        return True
+
+    async def update_book(self, book_id, changes, versions=None):
+        row = self._row(book_id)
+        if row is None:
+            return False, False
+        if versions is not None and row[self._VERSION] not in versions:
+            raise VersionConflictError(f"Book {book_id} is at version {row[self._VERSION]}")
+        return True, self._apply(row, changes)
+
+    def _remove(self, book_id):
+        row = self._rows[book_id - 1]
+        del self._ids_by_isbn[row[self._POSITIONS["isbn"]]]
+        self._rows[book_id - 1] = None
+
+    async def delete_book(self, book_id):
+        if self._row(book_id) is None:
+            return 0
+        self._remove(book_id)
+        return 1
+
+    def _select(self, ids, filters):
+        """Return ``(existing_ids, missing_ids)`` for a bulk selection."""
+        if ids is not None:
+            existing = [book_id for book_id in ids if self._row(book_id) is not None]
+            return existing, [book_id for book_id in ids if self._row(book_id) is None]
+        return [row[0] for row in self._rows if row is not None and self._matches(row, **filters)], []
+
+    async def bulk_update_books(self, changes, chunk_size, ids=None, filters=None):
+        matched, missing = self._select(ids, filters)
+        updated = sum(self._apply(self._rows[book_id - 1], changes) for book_id in matched)
+        return matched, updated, missing
+
+    async def bulk_delete_books(self, chunk_size, ids=None, filters=None):
+        deleted, missing = self._select(ids, filters)
+        for book_id in deleted:
+            self._remove(book_id)
+        return deleted, missing
+
+
+ENGINES = {"mysql": MySQLRepository, "sqlite": SQLiteRepository, "memory": InMemoryRepository}
+
+
+def create_repository(engine=config.BOOKS_STORAGE):
+    """Build the storage engine named by BOOKS_STORAGE."""
+    try:
+        return ENGINES[engine]()
+    except KeyError:
+        raise ValueError(f"Unknown BOOKS_STORAGE {engine!r}; expected one of {', '.join(ENGINES)}") from None
+
+
+repository = create_repository()  # The engine behind every /books/ route
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import storage  # noqa: E402
+
+
+def mysql_available():
+    connection = database.create_connection()
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+
+@pytest.fixture(params=["memory", "sqlite", "mysql"])
+def repository(request, tmp_path):
+    """An opened repository for each storage engine; MySQL is skipped when the server in config.py is unreachable."""
+    if request.param == "memory":
+        repository = storage.InMemoryRepository()
+    elif request.param == "sqlite":
+        repository = storage.SQLiteRepository(str(tmp_path / "books.db"))
+    else:
+        if not mysql_available():
+            pytest.skip("MySQL is not reachable")
+        repository = storage.MySQLRepository(database.ConnectionPool(min_size=0, statement_cache_size=0))
+    repository.open()
+    yield repository
+    repository.close()
+
+
+@pytest.fixture
+def isbn():
+    """A random ISBN, so runs against a shared MySQL database do not collide."""
+    return f"{random.randrange(1000):03d}-{random.randrange(10**10):010d}"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
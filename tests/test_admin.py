@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+import storage
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "repository", storage.SQLiteRepository(str(tmp_path / "books.db")))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_admin_routes_are_off_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    assert client.get("/admin/group-commit", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+def test_admin_routes_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+    assert client.put("/admin/group-commit", json={"enabled": True}).status_code == 401
+    assert client.put("/admin/group-commit", json={"enabled": True},
+                      headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.put("/admin/group-commit", json={"enabled": True}, headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert response.json()["enabled"] is True
+    assert main.repository.batcher.enabled
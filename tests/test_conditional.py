@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import storage
+from cache import book_cache
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "repository", storage.InMemoryRepository())
+    book_cache.clear()
+    with TestClient(main.app) as client:
+        client.post("/books/bulk", json=[{"title": f"Title {n}", "author": "Author", "genre": "Genre", "year_published": 2000,
+                                          "isbn": f"100-{n:010d}"} for n in range(50)])
+        yield client
+    book_cache.clear()
+
+
+def test_compressed_listing_has_its_own_strong_etag(client):
+    identity = client.get("/books/?limit=50", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/books/?limit=50", headers=GZIP)
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+
+    response = client.get("/books/?limit=50", headers={**GZIP, "If-None-Match": compressed.headers["etag"]})
+    assert response.status_code == 304
+    assert response.headers["etag"] == compressed.headers["etag"]  # The tag the 200 sent
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    response = client.get("/books/?limit=50", headers={"Accept-Encoding": "identity", "If-None-Match": compressed.headers["etag"]})
+    assert response.status_code == 200  # The gzip tag does not stand for the identity bytes
+
+
+def test_if_match_takes_encoded_tags_and_rejects_weak_ones(client):
+    etag = client.get("/books/1").headers["etag"]
+    assert client.patch("/books/1", json={"title": "New"}, headers={"If-Match": f"W/{etag}"}).status_code == 412
+    assert client.patch("/books/1", json={"title": "New"}, headers={"If-Match": etag[:-1] + '-gzip"'}).status_code == 200
+
+
+@pytest.mark.parametrize("since", ["Sun Nov  6 08:49:37 2094", "Sat, 06 Nov 2094 08:49:37 -0000"])
+def test_if_modified_since_without_a_zone_is_read_as_utc(client, since):
+    response = client.get("/books/1", headers={"If-Modified-Since": since})
+    assert response.status_code == 304
+    assert client.get("/books/1", headers={"If-Modified-Since": since.replace("2094", "1994")}).status_code == 200
@@ -0,0 +1,65 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from mysql.connector import Error, IntegrityError
+
+import crud
+import database
+import sqlite_adapter
+from database import is_duplicate_key
+
+
+@pytest.fixture
+def connection(tmp_path):
+    path = str(tmp_path / "books.db")
+    sqlite_adapter.create_schema(path)
+    pool = database.ConnectionPool(min_size=0, max_size=1, connect=lambda: sqlite_adapter.SQLiteConnection(path),
+                                   statement_cache_size=0)
+    with pool.connection() as connection:
+        yield connection
+    pool.close()
+
+
+def book(isbn, year_published=2000):
+    return SimpleNamespace(title="t", author="a", genre="g", year_published=year_published, isbn=isbn)
+
+
+def count_books(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM books")
+        return cursor.fetchall()[0][0]
+
+
+def test_duplicate_isbn_only_rejects_its_own_row(connection):
+    results = crud.create_books(connection, [book("111-0000000001"), book("111-0000000001"), book("111-0000000002")])
+    assert [book_id is not None for book_id, _ in results] == [True, False, True]
+    assert results[1][1] is not None
+    assert count_books(connection) == 2
+
+
+def test_other_errors_fail_the_whole_batch(connection):
+    with pytest.raises(Error):
+        crud.create_books(connection, [book("111-0000000001"), book("111-0000000002", year_published=object())])
+    assert count_books(connection) == 0  # The row inserted before the failure was rolled back, not committed
+
+
+def test_not_null_violation_is_not_a_duplicate(connection):
+    with pytest.raises(IntegrityError) as raised:
+        crud.create_books(connection, [book("111-0000000001"), SimpleNamespace(**{**vars(book("111-0000000002")), "title": None})])
+    assert not is_duplicate_key(raised.value)
+    assert count_books(connection) == 0
+
+
+def test_select_for_update_holds_the_write_lock_until_commit(connection, tmp_path):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT id FROM books WHERE id > %s FOR UPDATE", (0,))
+        cursor.fetchall()
+    other = sqlite3.connect(str(tmp_path / "books.db"), timeout=0)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            other.execute("INSERT INTO books (title, author, genre, year_published, isbn) VALUES ('t', 'a', 'g', 2000, 'x')")
+        connection.commit()
+        other.execute("INSERT INTO books (title, author, genre, year_published, isbn) VALUES ('t', 'a', 'g', 2000, 'x')")
+    finally:
+        other.close()
@@ -0,0 +1,34 @@
+import random
+
+from conftest import run
+from models import Book
+
+
+def page_version(repository, after_id, limit):
+    return run(repository.list_books(after_id, limit, ("id",)))[3]
+
+
+def test_page_version_changes_with_the_page_only(repository):
+    prefix = f"{random.randrange(1000):03d}-{random.randrange(10**6):06d}"
+    ids = [run(repository.create_book(Book(title="t", author="a", genre="g", year_published=2000, isbn=f"{prefix}{n:04d}")))
+           for n in range(4)]
+    after_id = ids[0] - 1
+    try:
+        version = page_version(repository, after_id, 2)  # Covers ids[0..2]: the page and the row deciding next_cursor
+        assert version[:2] == (3, ids[2])
+
+        run(repository.update_book(ids[1], {"title": "changed"}))
+        updated = page_version(repository, after_id, 2)
+        assert updated != version
+
+        run(repository.delete_book(ids[0]))  # The page slides forward onto ids[3]
+        deleted = page_version(repository, after_id, 2)
+        assert deleted != updated
+
+        short_page = page_version(repository, after_id, 1)  # ids[1] and ids[2]
+        run(repository.update_book(ids[3], {"title": "changed"}))  # A write past the page leaves its tag alone
+        assert page_version(repository, after_id, 1) == short_page
+        assert page_version(repository, ids[3], 2) == (0, None, None, None)  # An empty page
+    finally:
+        for book_id in ids:
+            run(repository.delete_book(book_id))
@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import replicas
+import storage
+from cache import book_cache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The API on the memory engine, with one (never contacted) replica so read-your-writes is active."""
+    replica = replicas.Replica("replica", 3306, database.ConnectionPool(min_size=0))
+    monkeypatch.setattr(replicas, "router", replicas.ReplicaRouter([replica]))
+    monkeypatch.setattr(main, "repository", storage.InMemoryRepository())
+    monkeypatch.setattr(main, "replica_lagging", {})
+    book_cache.clear()
+    with TestClient(main.app) as client:
+        yield client
+    book_cache.clear()
+
+
+def create(client, isbn):
+    response = client.post("/books/", json={"title": "Old", "author": "A", "genre": "G", "year_published": 2000, "isbn": isbn})
+    return response.json()["id"]
+
+
+def test_writer_skips_a_stale_cache_entry(client, isbn):
+    book_id = create(client, isbn)
+    book = client.get(f"/books/{book_id}").json()
+    stale = {"book": {**book, "title": "Stale"}, "version": 0, "last_modified": "Thu, 01 Jan 2026 00:00:00 GMT"}
+    book_cache.set(book_id, stale, book_cache.generation)  # As another worker might have cached it from a lagging replica
+
+    assert client.get(f"/books/{book_id}").json()["title"] == "Old"  # The POST set the read-your-writes cookie
+    assert client.get(f"/books/?ids={book_id}").json()["books"][0]["title"] == "Old"
+
+    client.cookies.clear()
+    book_cache.set(book_id, stale, book_cache.generation)
+    assert client.get(f"/books/{book_id}").json()["title"] == "Stale"  # Other clients are still served from the cache
+
+
+def test_replica_reads_of_recent_writes_are_not_cached(client, isbn):
+    book_id = create(client, isbn)
+    client.patch(f"/books/{book_id}", json={"title": "New"})
+    client.cookies.clear()
+    client.get(f"/books/{book_id}")  # Possibly from a replica that has not seen the update yet
+    assert book_cache.get(book_id) is None
+
+    main.replica_lagging[book_id] = 0  # The replicas have caught up
+    client.get(f"/books/{book_id}")
+    assert book_cache.get(book_id) is not None
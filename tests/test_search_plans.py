@@ -0,0 +1,68 @@
+import itertools
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import crud
+import database
+import main
+import storage
+from conftest import mysql_available, run
+from models import Book
+
+SEED_BOOKS = 2000  # Enough rows that MySQL's statistics favour the indexes over a scan
+FILTERS = ("q", "title", "author", "genre", "isbn", "years")
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """A MySQL pool plus a seeded sample book, whose values every filter combination searches for."""
+    if not mysql_available():
+        pytest.skip("MySQL is not reachable")
+    pool = database.ConnectionPool(min_size=0, statement_cache_size=0)
+    repository = storage.MySQLRepository(pool)
+    repository.open()
+    prefix = f"{random.randrange(1000):03d}-{random.randrange(10**4):04d}"
+    books = [Book(title=f"Plan check {word} volume {n}", author=f"Author {n % 97}", genre=f"Genre {n % 13}",
+                  year_published=1900 + n % 120, isbn=f"{prefix}{n:06d}")
+             for n, word in zip(range(SEED_BOOKS), itertools.cycle(("harbour", "lantern", "meridian", "orchard")))]
+    ids = [book_id for book_id, _ in run(repository.create_books(books))]
+    with pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("ANALYZE TABLE books")
+        cursor.fetchall()
+    yield pool, books[0]
+    with pool.connection() as connection:
+        for book_id in ids:
+            crud.delete_book(connection, book_id)
+    repository.close()
+
+
+def filter_values(book):
+    """Search filters that match ``book``; the year range is one filter of two parameters."""
+    return {
+        "q": {"q": "meridian"},
+        "title": {"title": "lantern"},
+        "author": {"author": book.author},
+        "genre": {"genre": book.genre},
+        "isbn": {"isbn": book.isbn},
+        "years": {"year_from": book.year_published - 5, "year_to": book.year_published + 5},
+    }
+
+
+@pytest.mark.parametrize("names", [names for size in range(1, len(FILTERS) + 1) for names in itertools.combinations(FILTERS, size)],
+                         ids="+".join)
+def test_search_never_scans_the_whole_table(seeded, names):
+    pool, book = seeded
+    values = filter_values(book)
+    filters = {key: value for name in names for key, value in values[name].items()}
+    with pool.connection() as connection:
+        plan = crud.explain_search(connection, **filters)
+    assert crud.full_table_scans(plan) == [], plan
+
+
+def test_search_without_filters_is_rejected(monkeypatch):
+    monkeypatch.setattr(main, "repository", storage.InMemoryRepository())
+    with TestClient(main.app) as client:
+        assert client.get("/books/search").status_code == 400
+        assert client.get("/books/search?genre=Fiction").status_code == 200
@@ -0,0 +1,73 @@
+import pytest
+from mysql.connector import errors
+
+import config
+import crud
+import database
+import slow_query
+import sqlite_adapter
+
+
+class UnreadCursor(sqlite_adapter.SQLiteCursor):
+    """Cursor that leaves its result unread until it is fetched to the end, as mysql.connector's do."""
+
+    def __init__(self, cursor, connection):
+        super().__init__(cursor)
+        self._connection = connection
+
+    def execute(self, query, params=()):
+        super().execute(query, params)
+        self._connection.unread_result = bool(self.column_names)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is None:
+            self._connection.unread_result = False
+        return row
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._connection.unread_result = False
+        return rows
+
+
+class UnreadConnection(sqlite_adapter.SQLiteConnection):
+    """SQLite connection that refuses new statements while a result is unread."""
+
+    unread_result = False
+
+    def cursor(self, **kwargs):
+        if self.unread_result:
+            raise errors.InternalError("Unread result found")
+        return UnreadCursor(self._connection.cursor(), self)
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    records = []
+    monkeypatch.setattr(config, "SLOW_QUERY_THRESHOLD_MS", 0.0)
+    monkeypatch.setattr(config, "SLOW_QUERY_EXPLAIN", True)
+    monkeypatch.setattr(slow_query, "log_slow_query",
+                        lambda statement, params, seconds, rows, plan=None: records.append((statement, rows, plan)))
+    return records
+
+
+@pytest.mark.parametrize("statement_cache_size", [0, 8])
+def test_slow_fetchone_statement_logs_a_plan(tmp_path, logged, statement_cache_size):
+    path = str(tmp_path / "books.db")
+    sqlite_adapter.create_schema(path)
+    pool = database.ConnectionPool(min_size=0, max_size=1, connect=lambda: UnreadConnection(path),
+                                   statement_cache_size=statement_cache_size)
+    with pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO books (title, author, genre, year_published, isbn) VALUES (%s, %s, %s, %s, %s)",
+                           ("t", "a", "g", 2000, "111-0000000001"))
+        logged.clear()
+        assert crud.get_book_by_isbn(connection, "111-0000000001") is not None
+        assert not connection.unread_result
+    pool.close()
+
+    [(statement, rows, plan)] = logged
+    assert statement.startswith("SELECT")
+    assert rows == 1
+    assert isinstance(plan, list) and plan
@@ -0,0 +1,17 @@
+import asyncio
+
+import main
+import storage
+from benchmarks.soak_test import check, run_soak
+
+
+def test_soak_leaves_no_connection_checked_out(monkeypatch, tmp_path):
+    repository = storage.SQLiteRepository(str(tmp_path / "books.db"))
+    monkeypatch.setattr(main, "repository", repository)
+    repository.open()
+    try:
+        soak, final, _ = asyncio.run(run_soak(main.app, repository.pool, requests=3000, concurrency=16, seed=0, settle_timeout=10))
+    finally:
+        repository.close()
+    assert final["in_use"] == 0
+    assert check(soak, final) == []
@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import run
+from models import Book
+
+
+@pytest.mark.parametrize("before, after", [("dune", "Dune"), ("Café", "Cafe")])
+def test_update_that_only_changes_case_or_accents_is_written(repository, isbn, before, after):
+    book_id = run(repository.create_book(Book(title=before, author="Frank Herbert", genre="SF",
+                                              year_published=1965, isbn=isbn)))
+    try:
+        assert run(repository.update_book(book_id, {"title": after})) == (True, True)
+        book, version, _ = run(repository.get_book(book_id))
+        assert book["title"] == after
+        assert version == 2
+        assert run(repository.update_book(book_id, {"title": after})) == (True, False)  # Same bytes: still a no-op
+    finally:
+        run(repository.delete_book(book_id))
+
+
+def test_bulk_update_that_only_changes_case_is_written(repository, isbn):
+    book_id = run(repository.create_book(Book(title="t", author="frank herbert", genre="SF",
+                                              year_published=1965, isbn=isbn)))
+    try:
+        matched, updated, missing = run(repository.bulk_update_books({"author": "Frank Herbert"}, 100, ids=[book_id]))
+        assert (matched, updated, missing) == ([book_id], 1, [])
+        assert run(repository.get_book(book_id))[0]["author"] == "Frank Herbert"
+    finally:
+        run(repository.delete_book(book_id))
+
+
+def test_bulk_update_by_filter_only_touches_matching_books(repository, isbn):
+    genre = f"Genre {isbn}"  # Unique per run, so a shared MySQL database does not interfere
+    ids = [run(repository.create_book(Book(title="t", author="a", genre=genre, year_published=year,
+                                           isbn=f"{isbn[:-1]}{n}"))) for n, year in enumerate((1990, 2010))]
+    try:
+        matched, updated, missing = run(repository.bulk_update_books({"author": "b"}, 1, filters={"genre": genre, "year_from": 2000}))
+        assert (matched, updated, missing) == ([ids[1]], 1, [])
+        assert run(repository.get_book(ids[0]))[0]["author"] == "a"
+        deleted, _ = run(repository.bulk_delete_books(1, filters={"genre": genre, "year_to": 2000}))
+        assert deleted == [ids[0]]
+    finally:
+        for book_id in ids:
+            run(repository.delete_book(book_id))